@@ -21,4 +21,9 @@ class MonthlyPaymentAdmin(admin.ModelAdmin):
 
 admin.site.register(EndOfDay)
 admin.site.register(EndOfDayItem)
-admin.site.register(SaleReturn)
\ No newline at end of file
+admin.site.register(SaleReturn)
+@admin.register(DailyLedger)
+class DailyLedgerAdmin(admin.ModelAdmin):
+    list_display = ['day', 'sale_type', 'payment_method', 'sales_count', 'sales_amount', 'returns_count', 'returns_amount']
+    list_filter = ['sale_type', 'payment_method']
+    date_hierarchy = 'day'
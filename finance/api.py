@@ -6,11 +6,13 @@ from .serializers import (
     SaleSerializer, 
     SaleReturnSerializer, 
     ClientSerializer,
-    MonthlyPaymentSerializer
+    MonthlyPaymentSerializer,
+    VoucherAllocationSerializer
 )
 from rest_framework.response import Response
 from loguru import logger
 from vouchers.models import Vouchers
+from .checkout import claim_vouchers, allocate_vouchers, VoucherUnavailable, InsufficientVouchers
 from django.db import transaction
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
@@ -52,23 +54,11 @@ class SaleViewSet(viewsets.ModelViewSet):
     serializer_class = SaleSerializer
     permission_classes = [IsAuthenticated]
 
-    def create(self, request, *args, **kwargs):
+    def get_or_update_client(self, client_data):
         """
-        Custom create method to handle multiple vouchers in a single sale and optionally create a client.
-        Expected payload:
-        {
-            "voucher": [1, 2],
-            "amount": 100.00,
-            "sale-type": "hourly",
-            "cashier": 1,
-            "client": {
-                "name": "John Doe",
-                "phonenumber": "0771234567",
-                "email": "john@example.com"
-            }
-        }
+        Gets or creates the sale's client from the optional client payload,
+        keyed by phone number, and updates a changed name or email.
         """
-        client_data = request.data.pop("client", None)
         client = None
 
         # Process client info only if provided
@@ -101,6 +91,26 @@ class SaleViewSet(viewsets.ModelViewSet):
                     if updated:
                         client.save()
 
+        return client
+
+    def create(self, request, *args, **kwargs):
+        """
+        Custom create method to handle multiple vouchers in a single sale and optionally create a client.
+        Expected payload:
+        {
+            "voucher": [1, 2],
+            "amount": 100.00,
+            "sale-type": "hourly",
+            "cashier": 1,
+            "client": {
+                "name": "John Doe",
+                "phonenumber": "0771234567",
+                "email": "john@example.com"
+            }
+        }
+        """
+        client = self.get_or_update_client(request.data.pop("client", None))
+
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -110,19 +120,11 @@ class SaleViewSet(viewsets.ModelViewSet):
             vouchers = [vouchers]
 
         vouchers = list(map(int, vouchers))
-        existing_vouchers = set(Vouchers.objects.filter(id__in=vouchers, status='unused').values_list("id", flat=True))
-        missing_vouchers = set(vouchers) - existing_vouchers
-
-        if missing_vouchers:
-            return Response(
-                {"message": f"Vouchers {list(missing_vouchers)} do not exist or have been sold."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
 
         try:
             with transaction.atomic():
-                # Mark vouchers as sold
-                Vouchers.objects.filter(pk__in=vouchers).update(status="sold", active=True)
+                # Claim the vouchers and save the sale in one transaction
+                claim_vouchers(vouchers)
 
                 # Save sale with or without client
                 sale = serializer.save(client=client)
@@ -141,6 +143,12 @@ class SaleViewSet(viewsets.ModelViewSet):
 
             return Response(data, status=status.HTTP_201_CREATED)
 
+        except VoucherUnavailable as e:
+            return Response(
+                {"message": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         except Exception as e:
             logger.error(f"Error creating sale: {str(e)}")
             return Response(
@@ -148,6 +156,66 @@ class SaleViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    def perform_update(self, serializer):
+        # the ledger moves in the transaction that saves the edit (finance.signals)
+        with transaction.atomic():
+            serializer.save()
+
+
+    @action(detail=False, methods=['post'])
+    def allocate(self, request):
+        """
+        Sells the next available vouchers of a category, picked server-side.
+        Expected payload:
+        {
+            "category": 1,
+            "quantity": 2,
+            "amount": 100.00,
+            "sale_type": "hourly",
+            "cashier": 1,
+            "client": {
+                "name": "John Doe",
+                "phonenumber": "0771234567"
+            }
+        }
+        """
+        allocation = VoucherAllocationSerializer(data=request.data)
+        if not allocation.is_valid():
+            return Response(allocation.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        client = self.get_or_update_client(request.data.pop("client", None))
+
+        sale_data = {key: value for key, value in request.data.items() if key not in ('voucher', 'category', 'quantity')}
+        serializer = self.get_serializer(data=sale_data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        category = allocation.validated_data['category']
+        quantity = allocation.validated_data['quantity']
+
+        try:
+            with transaction.atomic():
+                # Saving the sale first takes the write lock before vouchers are picked
+                sale = serializer.save(client=client)
+                vouchers = allocate_vouchers(category.id, quantity)
+                sale.voucher.add(*vouchers)
+
+            logger.info(f"Sale {sale.id} allocated {quantity} {category} vouchers by {request.user}")
+
+            data = {
+                'sales_data': SaleSerializer(sale).data,
+                'vouchers_data': list(Vouchers.objects.filter(id__in=vouchers).values(
+                    'id', 'voucher_no', 'voucher_user'
+                ))
+            }
+            return Response(data, status=status.HTTP_201_CREATED)
+
+        except (InsufficientVouchers, VoucherUnavailable) as e:
+            return Response(
+                {"message": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
 
 class MonthlyPaymentViewSet(viewsets.ModelViewSet):
     """
@@ -368,3 +436,12 @@ class SaleReturnViewSet(viewsets.ModelViewSet):
     queryset = SaleReturn.objects.all()
     serializer_class = SaleReturnSerializer
     permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        # the ledger is adjusted in the transaction that saves the return (finance.signals)
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
@@ -0,0 +1,95 @@
+from collections import Counter
+from django.db import transaction
+from vouchers.models import Vouchers
+from vouchers.inventory import move_inventory
+from vouchers.caching import invalidate_voucher_status
+from vouchers.journal import record_changes
+
+
+class VoucherUnavailable(Exception):
+    """Raised when vouchers requested for a sale are missing or already sold"""
+
+    def __init__(self, voucher_ids):
+        self.voucher_ids = sorted(voucher_ids)
+        super().__init__(f"Vouchers {self.voucher_ids} do not exist or have been sold.")
+
+
+class InsufficientVouchers(Exception):
+    """Raised when a category has fewer unused vouchers than requested"""
+
+    def __init__(self, category_id, quantity, available):
+        self.category_id = category_id
+        self.quantity = quantity
+        self.available = available
+        super().__init__(f"Only {available} unused vouchers left in category {category_id}, {quantity} requested.")
+
+
+class _ShortClaim(Exception):
+    pass
+
+
+@transaction.atomic
+def claim_vouchers(voucher_ids):
+    """
+    Marks the given unused vouchers as sold, all or nothing.
+
+    The claim is a single UPDATE conditional on status='unused' whose row
+    count must match the request. The UPDATE is the first statement so it
+    takes the write lock up front: on Postgres a concurrent checkout waits on
+    the row locks and then sees the vouchers as sold, on SQLite writers queue
+    on the busy timeout instead of failing a read -> write lock upgrade.
+    The category inventory moves from unused to sold and the change journal
+    is written in the same transaction; cached statuses are dropped when it
+    commits.
+    Call inside the transaction that creates the sale so a failure rolls
+    both back.
+    """
+    ids = set(map(int, voucher_ids))
+    if not ids:
+        return 0
+
+    try:
+        with transaction.atomic():
+            claimed = Vouchers.objects.filter(id__in=ids, status='unused').update(
+                status='sold', active=True, synced_to_pfsense=False
+            )
+            if claimed != len(ids):
+                raise _ShortClaim()
+    except _ShortClaim:
+        available = set(Vouchers.objects.filter(id__in=ids, status='unused').values_list('id', flat=True))
+        raise VoucherUnavailable(ids - available or ids)
+
+    # every claimed row was unused a moment ago
+    sold = Counter()
+    voucher_nos = []
+    for category_id, voucher_no in Vouchers.objects.filter(id__in=ids).values_list('file__category_id', 'voucher_no'):
+        sold[(category_id, 'unused')] += 1
+        voucher_nos.append(voucher_no)
+    move_inventory(sold, 'sold')
+    record_changes(ids)
+    invalidate_voucher_status(voucher_nos)
+    return claimed
+
+
+@transaction.atomic
+def allocate_vouchers(category_id, quantity):
+    """
+    Picks and claims the oldest `quantity` unused vouchers of a category.
+
+    Candidates are read with select_for_update(skip_locked=True, of=self) so
+    concurrent allocations on Postgres take disjoint vouchers without waiting,
+    then claimed with claim_vouchers. On SQLite the caller should have written
+    first in the transaction (e.g. saved the sale) so the read and the claim
+    happen under one write lock. Returns the claimed voucher ids.
+    """
+    ids = list(
+        Vouchers.objects.select_for_update(skip_locked=True, of=('self',))
+        .filter(status='unused', file__category_id=category_id)
+        .order_by('id')
+        .values_list('id', flat=True)[:quantity]
+    )
+    if len(ids) < quantity:
+        raise InsufficientVouchers(category_id, quantity, len(ids))
+
+    claim_vouchers(ids)
+    return ids
@@ -0,0 +1,124 @@
+import re
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+# 'x-sendfile' or 'x-accel-redirect' only sends headers and lets the front
+# proxy serve the bytes, anything else streams files from the worker
+SENDFILE = getattr(settings, 'EOD_PDF_SENDFILE', '')
+ACCEL_PREFIX = getattr(settings, 'EOD_PDF_ACCEL_PREFIX', '/protected-media/')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _validators(field_file, etag):
+    try:
+        modified = int(field_file.storage.get_modified_time(field_file.name).timestamp())
+    except (NotImplementedError, OSError):
+        modified = None
+    if etag is None:
+        etag = f"{field_file.name}-{field_file.size}-{modified}"
+    return quote_etag(etag), modified
+
+
+def _parse_range(header, size):
+    """
+    (start, end) inclusive of a single 'bytes=' range, None for a header that
+    is missing or not understood (the whole file is sent), 'unsatisfiable' for
+    a range past the end
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # suffix range: the last `last` bytes
+        length = int(last)
+        if not length:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _if_range_matches(request, etag, modified):
+    """A Range applies when If-Range is absent or still names this file"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag and not etag.startswith('W/')
+    return modified is not None and parse_http_date_safe(if_range) == modified
+
+
+def _read_range(field_file, start, end):
+    with field_file.open('rb') as stored:
+        stored.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            chunk = stored.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, field_file, filename, etag=None, content_type='application/octet-stream'):
+    """
+    Download response for a stored file.
+
+    Answers If-None-Match / If-Modified-Since with 304 from the ETag (`etag`,
+    or the file's name, size and mtime) and Last-Modified, streams the file
+    instead of reading it into memory, and serves single byte ranges with 206.
+    With EOD_PDF_SENDFILE set, the front proxy sends the bytes (and handles
+    ranges) instead.
+    """
+    etag, modified = _validators(field_file, etag)
+
+    def with_validators(response):
+        response['ETag'] = etag
+        if modified is not None:
+            response['Last-Modified'] = http_date(modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+    if not_modified is not None:
+        return with_validators(not_modified)
+
+    if SENDFILE in ('x-sendfile', 'x-accel-redirect'):
+        response = HttpResponse(content_type=content_type)
+        if SENDFILE == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = ACCEL_PREFIX + field_file.name
+        else:
+            response['X-Sendfile'] = field_file.path
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return with_validators(response)
+
+    size = field_file.size
+    byte_range = None
+    if request.method == 'GET' and _if_range_matches(request, etag, modified):
+        byte_range = _parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return with_validators(response)
+
+    if byte_range is None:
+        response = FileResponse(
+            field_file.open('rb'), as_attachment=True, filename=filename, content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(field_file, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Accept-Ranges'] = 'bytes'
+    return with_validators(response)
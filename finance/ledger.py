@@ -0,0 +1,75 @@
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyLedger, Sale, SaleReturn
+from .utils import day_range
+
+LEDGER_FIELDS = ('sales_count', 'sales_amount', 'returns_count', 'returns_amount')
+PAYMENT_METHODS = [method for method, _ in Sale._meta.get_field('payment_method').choices]
+
+
+def adjust_ledger(day, sale_type, payment_method, **deltas):
+    """
+    Adds `deltas` (sales_count, sales_amount, returns_count, returns_amount)
+    to one ledger row.
+
+    The row is bumped with an F() update, so concurrent sales don't lose
+    increments. Call it in the transaction that saves the sale or return so
+    the totals commit or roll back with it.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    row = DailyLedger.objects.filter(day=day, sale_type=sale_type, payment_method=payment_method)
+    if row.update(**{field: F(field) + delta for field, delta in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            DailyLedger.objects.create(day=day, sale_type=sale_type, payment_method=payment_method, **deltas)
+    except IntegrityError:
+        # another transaction created the row first
+        row.update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def sale_key(sale):
+    """Ledger row of a sale: (local day, sale_type, payment_method)"""
+    return timezone.localdate(sale.date), sale.sale_type, sale.payment_method
+
+
+@transaction.atomic
+def rebuild_ledger(day=None):
+    """
+    Recomputes the ledger of one local day, or every day, from the sales and
+    returns. Returns the number of rows written.
+    """
+    sales = Sale.objects.all()
+    returns = SaleReturn.objects.all()
+    ledger = DailyLedger.objects.all()
+    if day is not None:
+        start, end = day_range(day)
+        sales = sales.filter(date__gte=start, date__lt=end)
+        returns = returns.filter(date__gte=start, date__lt=end)
+        ledger = ledger.filter(day=day)
+
+    rows = defaultdict(lambda: dict.fromkeys(LEDGER_FIELDS, 0))
+    for row in (
+        sales.order_by().annotate(day=TruncDate('date')).values('day', 'sale_type', 'payment_method')
+        .annotate(count=Count('id'), amount=Sum('amount'))
+    ):
+        rows[(row['day'], row['sale_type'], row['payment_method'])].update(sales_count=row['count'], sales_amount=row['amount'])
+    for row in (
+        returns.order_by().annotate(day=TruncDate('date')).values('day', 'sale__sale_type', 'sale__payment_method')
+        .annotate(count=Count('id'), amount=Sum('amount'))
+    ):
+        rows[(row['day'], row['sale__sale_type'], row['sale__payment_method'])].update(
+            returns_count=row['count'], returns_amount=row['amount']
+        )
+
+    ledger.delete()
+    DailyLedger.objects.bulk_create([
+        DailyLedger(day=day, sale_type=sale_type, payment_method=payment_method, **values)
+        for (day, sale_type, payment_method), values in rows.items()
+    ])
+    return len(rows)
@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, DatabaseError
+from django.db.models import Count
+from finance.checkout import claim_vouchers, VoucherUnavailable
+from finance.models import Sale
+from users.models import User
+from vouchers.models import Vouchers, VoucherFile, VoucherCategory
+from vouchers.inventory import adjust_inventory
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent checkout benchmark. Creates its own category, file and vouchers, '
+        'runs parallel checkouts over them, checks that no voucher was sold twice '
+        'and deletes everything it created. Run it against a development database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vouchers', type=int, default=2000, help='Size of the voucher pool')
+        parser.add_argument('--workers', type=int, default=16, help='Parallel cashiers')
+        parser.add_argument('--per-sale', type=int, default=2, help='Vouchers per checkout')
+        parser.add_argument('--attempts', type=int, default=200, help='Checkouts per worker')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark rows')
+
+    def handle(self, *args, **options):
+        tag = f"bench-{uuid.uuid4().hex[:8]}"
+        cashier = User.objects.filter(is_superuser=True).first()
+        created_cashier = cashier is None
+        if created_cashier:
+            cashier = User.objects.create(username=tag[:32])
+
+        category = VoucherCategory.objects.create(name=tag)
+        voucher_file = VoucherFile.objects.create(user=cashier, name=tag, category=category, status='populated')
+        Vouchers.objects.bulk_create(
+            [Vouchers(user=cashier, voucher_no=f"{tag}-{i}", file=voucher_file) for i in range(options['vouchers'])],
+            batch_size=500
+        )
+        adjust_inventory({(category.id, 'unused'): options['vouchers']})
+        pool = list(Vouchers.objects.filter(file=voucher_file).values_list('id', flat=True))
+
+        results = {'sold': 0, 'conflicts': 0, 'errors': 0}
+        sale_ids = []
+        lock = threading.Lock()
+
+        def cashier_worker():
+            sold, conflicts, errors, sales = 0, 0, 0, []
+            try:
+                for _ in range(options['attempts']):
+                    # Random picks from a shared pool force cashiers to collide
+                    picks = random.sample(pool, options['per_sale'])
+                    try:
+                        with transaction.atomic():
+                            claim_vouchers(picks)
+                            sale = Sale.objects.create(amount=1, sale_type='hourly', cashier=cashier)
+                            sale.voucher.add(*picks)
+                        sold += 1
+                        sales.append(sale.id)
+                    except VoucherUnavailable:
+                        conflicts += 1
+                    except DatabaseError:
+                        # e.g. SQLite "database is locked" when a writer loses the race
+                        errors += 1
+            finally:
+                connection.close()
+            with lock:
+                results['sold'] += sold
+                results['conflicts'] += conflicts
+                results['errors'] += errors
+                sale_ids.extend(sales)
+
+        threads = [threading.Thread(target=cashier_worker) for _ in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = options['workers'] * options['attempts']
+        double_sold = (
+            Sale.voucher.through.objects.filter(vouchers_id__in=pool)
+            .values('vouchers_id').annotate(sales=Count('sale_id')).filter(sales__gt=1).count()
+        )
+        sold_vouchers = Vouchers.objects.filter(id__in=pool, status='sold').count()
+        linked_vouchers = Sale.voucher.through.objects.filter(vouchers_id__in=pool).count()
+
+        self.stdout.write(
+            f"{attempts} checkouts by {options['workers']} workers in {elapsed:.2f}s "
+            f"({attempts / elapsed:.0f}/s): {results['sold']} sold, "
+            f"{results['conflicts']} unavailable, {results['errors']} database errors"
+        )
+        self.stdout.write(f"{sold_vouchers} vouchers marked sold, {linked_vouchers} linked to sales")
+
+        if not options['keep']:
+            Sale.objects.filter(id__in=sale_ids).delete()
+            category.delete()
+            if created_cashier:
+                cashier.delete()
+
+        if double_sold or sold_vouchers != linked_vouchers:
+            raise CommandError(f"{double_sold} vouchers were sold more than once")
+        self.stdout.write(self.style.SUCCESS('No voucher was sold twice'))
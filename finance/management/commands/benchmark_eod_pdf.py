@@ -0,0 +1,82 @@
+import multiprocessing
+import resource
+import tempfile
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from finance.models import Sale
+from finance.pdf import RENDERERS, render_pdf
+from finance.reports import summarise
+
+SALE_TYPES = [sale_type for sale_type, _ in Sale._meta.get_field('sale_type').choices]
+PAYMENT_METHODS = [method for method, _ in Sale._meta.get_field('payment_method').choices]
+
+
+def synthetic_report(rows):
+    """A report with `rows` breakdown rows, no database involved"""
+    return summarise([
+        {
+            'sale_type': SALE_TYPES[i % len(SALE_TYPES)],
+            'payment_method': PAYMENT_METHODS[i % len(PAYMENT_METHODS)],
+            'count': 1,
+            'amount': Decimal(f"{1 + i % 50}.50"),
+            'returns': Decimal('0.00'),
+            'net': Decimal(f"{1 + i % 50}.50"),
+        }
+        for i in range(rows)
+    ])
+
+
+def _measure(renderer, rows, results):
+    # runs in a forked process, so ru_maxrss is the peak of this render alone
+    report = synthetic_report(rows)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with tempfile.TemporaryFile() as dest:
+            started = time.perf_counter()
+            render_pdf(report, timezone.localdate(), dest, renderer=renderer)
+            elapsed = time.perf_counter() - started
+            size = dest.tell()
+    except Exception as e:
+        results.send(e)
+        return
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.send((elapsed, before, peak, size))
+
+
+class Command(BaseCommand):
+    help = (
+        'EOD pdf renderer benchmark. Renders synthetic reports of each size with each '
+        'renderer in a separate process and prints render time and peak RSS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help='Report rows')
+        parser.add_argument('--renderer', choices=list(RENDERERS), nargs='+', default=list(RENDERERS))
+        parser.add_argument('--timeout', type=int, default=600, help='Seconds before a render is abandoned')
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(f"{'renderer':<10} {'rows':>8} {'seconds':>9} {'peak RSS MB':>12} {'growth MB':>10} {'pdf KB':>8}")
+        for rows in options['rows']:
+            for renderer in options['renderer']:
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_measure, args=(renderer, rows, sender))
+                process.start()
+                if not receiver.poll(options['timeout']):
+                    process.terminate()
+                    process.join()
+                    self.stdout.write(f"{renderer:<10} {rows:>8} {'timed out':>9}")
+                    continue
+                result = receiver.recv()
+                process.join()
+                if isinstance(result, Exception):
+                    self.stdout.write(f"{renderer:<10} {rows:>8} failed: {result}")
+                    continue
+                elapsed, before, peak, size = result
+                # ru_maxrss is in KB on Linux
+                self.stdout.write(
+                    f"{renderer:<10} {rows:>8} {elapsed:>9.2f} {peak / 1024:>12.1f} "
+                    f"{(peak - before) / 1024:>10.1f} {size / 1024:>8.0f}"
+                )
@@ -0,0 +1,19 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from finance.ledger import rebuild_ledger
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales ledger from the sales and returns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--day', help='Only this local day (YYYY-MM-DD), default every day')
+
+    def handle(self, *args, **options):
+        day = None
+        if options['day']:
+            try:
+                day = datetime.date.fromisoformat(options['day'])
+            except ValueError:
+                raise CommandError('--day must be YYYY-MM-DD')
+        rows = rebuild_ledger(day)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} ledger rows"))
@@ -0,0 +1,139 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0002_voucherfile_import_status'),
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='endofday',
+            options={'ordering': ['-date']},
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='client_type',
+            field=models.CharField(choices=[('casual', 'Casual'), ('permanent', 'Permanent Member')], default='casual', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='membership_end_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='membership_start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='monthly_fee',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='endofday',
+            name='bank_transfer_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='endofday',
+            name='card_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='endofday',
+            name='cash_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='endofday',
+            name='mobile_money_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='endofday',
+            name='total_sales_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='is_monthly_payment',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='notes',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='payment_method',
+            field=models.CharField(choices=[('cash', 'Cash'), ('mobile_money', 'Mobile Money'), ('bank_transfer', 'Bank Transfer'), ('card', 'Card')], default='cash', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='payment_month',
+            field=models.DateField(blank=True, help_text='Month this payment covers', null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='payment_reference',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='salereturn',
+            name='reason',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='endofday',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='endofdayitem',
+            name='eod',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='finance.endofday'),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='client',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='finance.client'),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='voucher',
+            field=models.ManyToManyField(blank=True, to='vouchers.vouchers'),
+        ),
+        migrations.CreateModel(
+            name='MonthlyPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_month', models.DateField(help_text='Month this payment is for')),
+                ('due_date', models.DateField()),
+                ('payment_date', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('overdue', 'Overdue'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_payments', to='finance.client')),
+                ('sale', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='monthly_payment_record', to='finance.sale')),
+            ],
+            options={
+                'ordering': ['-payment_month'],
+                'unique_together': {('client', 'payment_month')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_monthly_payments_and_breakdowns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='monthlypayment',
+            index=models.Index(fields=['status', 'due_date'], name='monthlypayment_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date'], name='sale_date_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:23
+
+from collections import defaultdict
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def fill_ledger(apps, schema_editor):
+    Sale = apps.get_model('finance', 'Sale')
+    SaleReturn = apps.get_model('finance', 'SaleReturn')
+    DailyLedger = apps.get_model('finance', 'DailyLedger')
+
+    rows = defaultdict(dict)
+    for row in (
+        Sale.objects.order_by().annotate(day=TruncDate('date')).values('day', 'sale_type', 'payment_method')
+        .annotate(count=models.Count('id'), amount=models.Sum('amount'))
+    ):
+        rows[(row['day'], row['sale_type'], row['payment_method'])].update(sales_count=row['count'], sales_amount=row['amount'])
+    for row in (
+        SaleReturn.objects.order_by().annotate(day=TruncDate('date')).values('day', 'sale__sale_type', 'sale__payment_method')
+        .annotate(count=models.Count('id'), amount=models.Sum('amount'))
+    ):
+        rows[(row['day'], row['sale__sale_type'], row['sale__payment_method'])].update(
+            returns_count=row['count'], returns_amount=row['amount']
+        )
+    DailyLedger.objects.bulk_create([
+        DailyLedger(day=day, sale_type=sale_type, payment_method=payment_method, **values)
+        for (day, sale_type, payment_method), values in rows.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sale_type', models.CharField(max_length=50)),
+                ('payment_method', models.CharField(max_length=50)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('sales_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('returns_count', models.IntegerField(default=0)),
+                ('returns_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-day', 'sale_type', 'payment_method'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyledger',
+            constraint=models.UniqueConstraint(fields=('day', 'sale_type', 'payment_method'), name='dailyledger_day_type_method_uniq'),
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
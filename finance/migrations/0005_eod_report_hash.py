@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_daily_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endofday',
+            name='report_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
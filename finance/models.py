@@ -49,6 +49,9 @@ class Sale(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date'], name='sale_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.sale_type} - {self.amount}'
@@ -65,6 +68,31 @@ class SaleReturn(models.Model):
         return f'{self.sale} - {self.amount}'
 
 
+class DailyLedger(models.Model):
+    """
+    Running sales and returns totals per local day, sale type and payment
+    method, kept up to date by the Sale and SaleReturn signals (see
+    finance.ledger)
+    """
+    day = models.DateField()
+    sale_type = models.CharField(max_length=50)
+    payment_method = models.CharField(max_length=50)
+    sales_count = models.IntegerField(default=0)
+    sales_amount = models.DecimalField(default=0, max_digits=12, decimal_places=2)
+    returns_count = models.IntegerField(default=0)
+    returns_amount = models.DecimalField(default=0, max_digits=12, decimal_places=2)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-day', 'sale_type', 'payment_method']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'sale_type', 'payment_method'], name='dailyledger_day_type_method_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.sale_type} {self.payment_method}: {self.sales_amount}"
+
+
 class EndOfDay(models.Model):
     date = models.DateField()
     pdf = models.FileField(upload_to='end_of_days/', null=True, blank=True)
@@ -76,6 +104,8 @@ class EndOfDay(models.Model):
     mobile_money_amount = models.DecimalField(default=0, max_digits=10, decimal_places=2)
     bank_transfer_amount = models.DecimalField(default=0, max_digits=10, decimal_places=2)
     card_amount = models.DecimalField(default=0, max_digits=10, decimal_places=2)
+    # content hash of the report the stored pdf was rendered from
+    report_hash = models.CharField(max_length=64, blank=True, default='')
 
     class Meta:
         ordering = ['-date']
@@ -115,6 +145,9 @@ class MonthlyPayment(models.Model):
     class Meta:
         ordering = ['-payment_month']
         unique_together = ['client', 'payment_month']
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='monthlypayment_status_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.client.name} - {self.payment_month.strftime('%B %Y')} - {self.status}"
\ No newline at end of file
@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.template.loader import get_template
+from loguru import logger
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from xhtml2pdf import pisa
+
+# 'reportlab' draws the tables with platypus, 'xhtml2pdf' renders the HTML
+# template; the template is also the fallback when reportlab fails
+PDF_RENDERER = getattr(settings, 'EOD_PDF_RENDERER', 'reportlab')
+# breakdown rows per platypus Table: splitting one long table across pages
+# re-measures its remaining rows on every page
+TABLE_CHUNK_ROWS = 500
+
+ACCENT = colors.HexColor('#4F46E5')
+HEADER_BACKGROUND = colors.HexColor('#F3F4F6')
+TOTAL_BACKGROUND = colors.HexColor('#F9FAFB')
+RULE = colors.HexColor('#E5E7EB')
+
+
+def _money(amount):
+    return f"${amount:,.2f}"
+
+
+def _breakdown_style(last_row=None):
+    commands = [
+        ('BACKGROUND', (0, 0), (-1, 0), HEADER_BACKGROUND),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.5, RULE),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+    ]
+    if last_row:
+        commands += [
+            ('BACKGROUND', (0, last_row), (-1, last_row), TOTAL_BACKGROUND),
+            ('FONTNAME', (0, last_row), (-1, last_row), 'Helvetica-Bold'),
+        ]
+    return TableStyle(commands)
+
+
+def render_reportlab(report, day, dest):
+    """
+    Draws the report with reportlab platypus: a summary table, then the
+    breakdown rows in tables of TABLE_CHUNK_ROWS, so pages are laid out in
+    one pass however many rows there are
+    """
+    styles = getSampleStyleSheet()
+    title = styles['Title']
+    title.textColor = ACCENT
+
+    story = [
+        Paragraph('End of Day Report', title),
+        Paragraph(f"Report for <b>{day:%Y-%m-%d}</b>", styles['Normal']),
+        Spacer(1, 6 * mm),
+        Table(
+            [
+                ['Total Sales:', _money(report['net_amount'])],
+                ['Number of Transactions:', report['sales_count']],
+                ['Returns:', f"-{_money(report['returns_amount'])}"],
+            ],
+            colWidths=[60 * mm, 40 * mm],
+            hAlign='LEFT',
+            style=TableStyle([('ALIGN', (1, 0), (1, -1), 'RIGHT'), ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold')]),
+        ),
+        Spacer(1, 6 * mm),
+        Paragraph('Sales Breakdown', styles['Heading2']),
+    ]
+
+    header = ['Sale Type', 'Payment Method', 'Items', 'Amount']
+    widths = [55 * mm, 50 * mm, 25 * mm, 40 * mm]
+    rows = report['rows']
+    for start in range(0, len(rows), TABLE_CHUNK_ROWS):
+        chunk = [
+            [row['sale_type'], row['payment_method'], row['count'], _money(row['amount'])]
+            for row in rows[start:start + TABLE_CHUNK_ROWS]
+        ]
+        story.append(Table([header] + chunk, colWidths=widths, repeatRows=1, style=_breakdown_style()))
+
+    totals = [header]
+    if report['returns_amount']:
+        totals.append(['Returns', '', '', f"-{_money(report['returns_amount'])}"])
+    totals.append(['Total', '', report['sales_count'], _money(report['net_amount'])])
+    story.append(Table(totals, colWidths=widths, style=_breakdown_style(last_row=len(totals) - 1)))
+
+    SimpleDocTemplate(
+        dest, pagesize=A4, title=f"End of Day Report {day:%Y-%m-%d}",
+        leftMargin=20 * mm, rightMargin=20 * mm, topMargin=20 * mm, bottomMargin=20 * mm,
+    ).build(story)
+
+
+def render_xhtml2pdf(report, day, dest):
+    """Renders the report through the HTML template with xhtml2pdf"""
+    html = get_template('end_of_day/end_of_day_report_template.html').render({
+        'report': report,
+        'date': day.strftime('%Y-%m-%d'),
+        'total_sales': report['net_amount'],
+        'total_items': report['sales_count'],
+    })
+    if pisa.CreatePDF(html, dest=dest).err:
+        raise RuntimeError(f"Could not render the report pdf of {day}")
+
+
+RENDERERS = {
+    'reportlab': render_reportlab,
+    'xhtml2pdf': render_xhtml2pdf,
+}
+
+
+def render_pdf(report, day, dest, renderer=None):
+    """
+    Writes the report pdf of `day` to the open binary file dest with the
+    EOD_PDF_RENDERER, falling back to xhtml2pdf if reportlab fails
+    """
+    renderer = renderer or PDF_RENDERER
+    if renderer not in RENDERERS:
+        raise ValueError(f"Unknown EOD pdf renderer {renderer!r}, expected one of {', '.join(RENDERERS)}")
+    if renderer == 'xhtml2pdf':
+        return render_xhtml2pdf(report, day, dest)
+
+    start = dest.tell()
+    try:
+        return RENDERERS[renderer](report, day, dest)
+    except Exception:
+        logger.exception(f"Could not render the report pdf of {day} with {renderer}, falling back to xhtml2pdf")
+        dest.seek(start)
+        dest.truncate()
+        return render_xhtml2pdf(report, day, dest)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.mail import EmailMultiAlternatives
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+from loguru import logger
+from management.cache import cache_key
+from .models import EndOfDay
+from .reports import eod_report, eod_fields
+from .pdf import PDF_RENDERER, render_pdf
+
+# End of day report pipeline: aggregate -> render -> store -> notify, run as a
+# chain of tasks (see finance.tasks.eod_report_pipeline). Stages hand each other
+# {'eod_id', 'report_hash'}; the report is cached and the pdf spooled under
+# that hash, so every stage can be retried and the pdf is rendered once.
+
+REPORT_DIR = 'eod_reports'
+REPORT_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def report_hash(eod, report):
+    """sha256 of the report content a pdf is rendered from, and of its renderer"""
+    content = json.dumps(
+        {'date': eod.date, 'renderer': PDF_RENDERER, 'report': report}, cls=DjangoJSONEncoder, sort_keys=True
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _report_key(eod_id, digest):
+    return cache_key('eod', eod_id, 'report', digest)
+
+
+def _spool_path(eod, digest):
+    return os.path.join(settings.MEDIA_ROOT, REPORT_DIR, f"eod_report_{eod.date:%Y-%m-%d}_{digest[:12]}.pdf")
+
+
+def _is_stored(eod, digest):
+    return bool(eod.pdf) and eod.report_hash == digest
+
+
+def aggregate(eod_id):
+    """Computes and caches the report of an EndOfDay; returns the stage for render()"""
+    eod = EndOfDay.objects.get(id=eod_id)
+    report = eod_report(eod_id)
+    digest = report_hash(eod, report)
+    cache.set(_report_key(eod_id, digest), report, REPORT_CACHE_TIMEOUT)
+    return {'eod_id': eod_id, 'report_hash': digest}
+
+
+def stage_report(eod, stage):
+    """
+    The report of a stage from the cache. When it was evicted the report is
+    computed again, and stage['report_hash'] follows it if the sales changed.
+    """
+    report = cache.get(_report_key(eod.id, stage['report_hash']))
+    if report is None:
+        report = eod_report(eod.id)
+        digest = report_hash(eod, report)
+        if digest != stage['report_hash']:
+            logger.info(f"Report of {eod} changed since it was aggregated")
+            stage['report_hash'] = digest
+        cache.set(_report_key(eod.id, digest), report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def render(stage):
+    """
+    Renders the report pdf to a spool file named by the report hash, unless
+    it is already spooled or stored for that hash
+    """
+    eod = EndOfDay.objects.get(id=stage['eod_id'])
+    if _is_stored(eod, stage['report_hash']) or os.path.exists(_spool_path(eod, stage['report_hash'])):
+        return stage
+
+    report = stage_report(eod, stage)
+    path = _spool_path(eod, stage['report_hash'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # rendered next to the spool path and renamed, a retry never sees half a pdf
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.part', delete=False) as part:
+        try:
+            render_pdf(report, eod.date, part)
+        except Exception:
+            part.close()
+            os.remove(part.name)
+            raise
+    os.replace(part.name, path)
+    logger.info(f"Rendered {path}")
+    return stage
+
+
+def store(stage):
+    """
+    Saves the spooled pdf to EndOfDay.pdf with its report hash, and the
+    EndOfDay totals from the report it was rendered from
+    """
+    eod = EndOfDay.objects.get(id=stage['eod_id'])
+    if _is_stored(eod, stage['report_hash']):
+        return stage
+
+    report = stage_report(eod, stage)
+    path = _spool_path(eod, stage['report_hash'])
+    if not os.path.exists(path):
+        # spool removed after a failed store, render it again
+        stage = render(stage)
+        path = _spool_path(eod, stage['report_hash'])
+
+    previous = eod.pdf.name if eod.pdf else None
+    with open(path, 'rb') as pdf_file:
+        eod.pdf.save(f"eod_report_{eod.date:%Y-%m-%d}.pdf", File(pdf_file), save=False)
+    eod.report_hash = stage['report_hash']
+    totals = eod_fields(report)
+    for field, value in totals.items():
+        setattr(eod, field, value)
+    eod.save(update_fields=['pdf', 'report_hash', *totals])
+    os.remove(path)
+    if previous and previous != eod.pdf.name:
+        eod.pdf.storage.delete(previous)
+    return stage
+
+
+def notify(stage):
+    """Emails the report with the stored pdf attached"""
+    eod = EndOfDay.objects.get(id=stage['eod_id'])
+    report = stage_report(eod, stage)
+    today = eod.date.strftime('%Y-%m-%d')
+
+    # dashboard_url = f"{settings.BASE_URL}/end-of-day/{eod.id}/"
+    context = {
+        'eod': eod,
+        'report': report,
+        'date': today,
+        'year': date.today().year,
+        'sales_cat_totals': report['by_sale_type'],
+        # 'dashboard_url': dashboard_url
+    }
+
+    html_message = render_to_string('emails/eod_report_email.html', context)
+    email = EmailMultiAlternatives(
+        subject=f"End of Day Report - {today}",
+        body=strip_tags(html_message),
+        from_email="admin@techcity.co.zw",
+        to=['cassy@email.com'],
+    )
+    email.attach_alternative(html_message, "text/html")
+    with eod.pdf.open('rb') as pdf_file:
+        email.attach(f"eod_report_{today}.pdf", pdf_file.read(), 'application/pdf')
+    email.send()
+
+    logger.info(f"EOD report email sent successfully for {today}")
+    return stage
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from decimal import Decimal
+from .models import DailyLedger, EndOfDay
+from .ledger import PAYMENT_METHODS
+
+ZERO = Decimal('0.00')
+
+
+def day_breakdown(day):
+    """
+    Totals of a local day per sale type and payment method, read from its
+    ledger rows: [{'sale_type', 'payment_method', 'count', 'amount',
+    'returns', 'net'}]. Returns count on the day they are made, under the
+    type and method of the sale they return (see finance.signals).
+    """
+    rows = (
+        DailyLedger.objects.filter(day=day)
+        .exclude(sales_count=0, returns_count=0)
+        .order_by('sale_type', 'payment_method')
+        .values('sale_type', 'payment_method', 'sales_count', 'sales_amount', 'returns_amount')
+    )
+    return [
+        {
+            'sale_type': row['sale_type'],
+            'payment_method': row['payment_method'],
+            'count': row['sales_count'],
+            'amount': row['sales_amount'],
+            'returns': row['returns_amount'],
+            'net': row['sales_amount'] - row['returns_amount'],
+        }
+        for row in rows
+    ]
+
+
+def summarise(rows):
+    """
+    Report totals over day_breakdown rows:
+    {'rows', 'sales_count', 'sales_amount', 'returns_amount', 'net_amount',
+     'by_sale_type': {sale_type: net}, 'by_payment_method': {method: net}}
+    with every payment method present.
+    """
+    by_sale_type = defaultdict(lambda: ZERO)
+    by_payment_method = {method: ZERO for method in PAYMENT_METHODS}
+    for row in rows:
+        by_sale_type[row['sale_type']] += row['net']
+        by_payment_method[row['payment_method']] = by_payment_method.get(row['payment_method'], ZERO) + row['net']
+    return {
+        'rows': rows,
+        'sales_count': sum(row['count'] for row in rows),
+        'sales_amount': sum((row['amount'] for row in rows), ZERO),
+        'returns_amount': sum((row['returns'] for row in rows), ZERO),
+        'net_amount': sum((row['net'] for row in rows), ZERO),
+        'by_sale_type': dict(by_sale_type),
+        'by_payment_method': by_payment_method,
+    }
+
+
+def day_report(day):
+    """Report of a local day, see summarise"""
+    return summarise(day_breakdown(day))
+
+
+def eod_report(eod_id):
+    """Report of the day an EndOfDay closed, see summarise"""
+    return day_report(EndOfDay.objects.values_list('date', flat=True).get(id=eod_id))
+
+
+def eod_fields(report):
+    """The EndOfDay totals of a report, net of returns like the pdf and email"""
+    by_payment_method = report['by_payment_method']
+    return {
+        'amount': report['net_amount'],
+        'total_sales_count': report['sales_count'],
+        'cash_amount': by_payment_method['cash'],
+        'mobile_money_amount': by_payment_method['mobile_money'],
+        'bank_transfer_amount': by_payment_method['bank_transfer'],
+        'card_amount': by_payment_method['card'],
+    }
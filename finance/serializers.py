@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Sale, SaleReturn, Client, MonthlyPayment
+from vouchers.models import VoucherCategory
 from datetime import datetime
 
 
@@ -127,4 +128,16 @@ class MonthlyPaymentSerializer(serializers.ModelSerializer):
         fields = ['id', 'client', 'client_name', 'client_phone', 'sale', 'amount', 
                   'payment_month', 'due_date', 'payment_date', 'status', 'notes', 
                   'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class VoucherAllocationSerializer(serializers.Serializer):
+    """
+    Validates a request to sell the next available vouchers of a category.
+
+    Fields:
+        category (int): The ID of the voucher category to sell from.
+        quantity (int): How many vouchers to allocate to the sale.
+    """
+    category = serializers.PrimaryKeyRelatedField(queryset=VoucherCategory.objects.all())
+    quantity = serializers.IntegerField(min_value=1, max_value=100)
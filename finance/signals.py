@@ -0,0 +1,97 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from management.cache import invalidate
+from .models import Sale, SaleReturn, EndOfDay
+from .ledger import adjust_ledger, sale_key
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def invalidate_sales_cache(sender, instance, **kwargs):
+    """Drops the dashboard sales totals that include this sale"""
+    days = {timezone.localdate()}
+    if instance.date:
+        days.add(timezone.localdate(instance.date))
+    invalidate(
+        'dashboard',
+        *[('sales', period) for period in ('all', 'week', 'month', 'year')],
+        *[('todays_sales', day) for day in days],
+    )
+
+
+@receiver(post_save, sender=EndOfDay)
+@receiver(post_delete, sender=EndOfDay)
+def invalidate_eod_cache(sender, instance, **kwargs):
+    invalidate('eod', instance.id)
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=SaleReturn)
+@receiver(post_delete, sender=SaleReturn)
+def invalidate_eod_report(sender, instance, **kwargs):
+    """Drops the cached reports of the closed days whose ledger a sale or return moved"""
+    key = sale_key if sender is Sale else _return_key
+    days = {key(instance)[0]}
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None:
+        days.add(key(previous)[0])
+        if sender is Sale and key(previous)[1:] != key(instance)[1:]:
+            # its returns moved with it, see record_sale
+            days.update(timezone.localdate(date) for date in instance.salereturn_set.values_list('date', flat=True))
+    eod_ids = EndOfDay.objects.filter(date__in=days).values_list('id', flat=True)
+    invalidate('eod', *[(eod_id,) for eod_id in eod_ids])
+
+
+@receiver(pre_save, sender=Sale)
+@receiver(pre_save, sender=SaleReturn)
+def remember_ledger_entry(sender, instance, **kwargs):
+    """Keeps the stored row of an edited sale or return, to move its totals in post_save"""
+    instance._ledger_previous = sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Sale)
+def record_sale(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None and not created:
+        if (sale_key(previous), previous.amount) == (sale_key(instance), instance.amount):
+            return
+        adjust_ledger(*sale_key(previous), sales_count=-1, sales_amount=-previous.amount)
+        if sale_key(previous)[1:] != sale_key(instance)[1:]:
+            _move_returns(instance, previous)
+    adjust_ledger(*sale_key(instance), sales_count=1, sales_amount=instance.amount)
+
+
+def _move_returns(sale, previous):
+    # the sale's returns are filed under its type and method, which changed
+    for sale_return in SaleReturn.objects.filter(sale=sale):
+        day = timezone.localdate(sale_return.date)
+        adjust_ledger(day, previous.sale_type, previous.payment_method, returns_count=-1, returns_amount=-sale_return.amount)
+        adjust_ledger(day, sale.sale_type, sale.payment_method, returns_count=1, returns_amount=sale_return.amount)
+
+
+@receiver(post_delete, sender=Sale)
+def unrecord_sale(sender, instance, **kwargs):
+    adjust_ledger(*sale_key(instance), sales_count=-1, sales_amount=-instance.amount)
+
+
+def _return_key(sale_return):
+    # returns count on the day they are made, under the sale's type and method
+    _, sale_type, payment_method = sale_key(sale_return.sale)
+    return timezone.localdate(sale_return.date), sale_type, payment_method
+
+
+@receiver(post_save, sender=SaleReturn)
+def record_return(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None and not created:
+        if (_return_key(previous), previous.amount) == (_return_key(instance), instance.amount):
+            return
+        adjust_ledger(*_return_key(previous), returns_count=-1, returns_amount=-previous.amount)
+    adjust_ledger(*_return_key(instance), returns_count=1, returns_amount=instance.amount)
+
+
+@receiver(post_delete, sender=SaleReturn)
+def unrecord_return(sender, instance, **kwargs):
+    adjust_ledger(*_return_key(instance), returns_count=-1, returns_amount=-instance.amount)
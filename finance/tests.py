@@ -1 +1,165 @@
-from django.test import TestCase
+import datetime
+import tempfile
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.utils import timezone
+from management.celery import app
+from users.models import User
+from .models import Sale, SaleReturn, MonthlyPayment, EndOfDay, DailyLedger
+from .ledger import rebuild_ledger
+from .reports import eod_fields
+from .utils import day_range
+
+
+@skipUnless(connection.vendor == 'sqlite', 'index names in plans are checked on SQLite')
+class HotQueryIndexTests(TestCase):
+    """The day and overdue queries are served by their indexes"""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f"INDEX {index_name}", plan, plan)
+
+    def test_sales_of_a_day(self):
+        start, end = day_range(timezone.localdate())
+        self.assertUsesIndex(Sale.objects.filter(date__gte=start, date__lt=end), 'sale_date_idx')
+
+    def test_overdue_monthly_payments(self):
+        self.assertUsesIndex(
+            MonthlyPayment.objects.filter(status='pending', due_date__lt=datetime.date.today()),
+            'monthlypayment_status_due_idx',
+        )
+
+
+class EndOfDayTests(TestCase):
+
+    def setUp(self):
+        self.cashier = User.objects.create(username='cashier')
+        self.client.force_login(self.cashier)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+    def sale(self, amount, payment_method='cash', **fields):
+        return Sale.objects.create(
+            amount=Decimal(amount), sale_type='hourly', payment_method=payment_method, cashier=self.cashier, **fields
+        )
+
+    def test_stored_totals_match_the_pdf(self):
+        sale = self.sale('100.00')
+        SaleReturn.objects.create(sale=sale, amount=Decimal('30.00'), cashier=self.cashier)
+        # a return made today against yesterday's sale counts today
+        earlier = self.sale('50.00', payment_method='mobile_money')
+        earlier.date -= datetime.timedelta(days=1)
+        earlier.save()
+        SaleReturn.objects.create(sale=earlier, amount=Decimal('20.00'), cashier=self.cashier)
+
+        rendered = []
+
+        def render_pdf(report, day, dest):
+            rendered.append(report)
+            dest.write(b'%PDF-1.4')
+
+        with mock.patch('finance.pipeline.render_pdf', render_pdf), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('finance:end_of_day'))
+
+        eod = EndOfDay.objects.get()
+        report, = rendered
+        self.assertEqual(
+            {field: getattr(eod, field) for field in eod_fields(report)},
+            eod_fields(report),
+        )
+        self.assertEqual((report['sales_amount'], report['returns_amount'], report['net_amount']), (100, 50, 50))
+        self.assertEqual((eod.amount, eod.total_sales_count), (Decimal('50.00'), 1))
+        self.assertEqual((eod.cash_amount, eod.mobile_money_amount), (Decimal('70.00'), Decimal('-20.00')))
+        self.assertTrue(eod.pdf)
+
+
+class LedgerTests(TestCase):
+    """The daily ledger follows sales and returns as they are saved and deleted"""
+
+    def setUp(self):
+        self.cashier = User.objects.create(username='cashier')
+        self.today = timezone.localdate()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+
+    def sale(self, amount, payment_method='cash'):
+        return Sale.objects.create(
+            amount=Decimal(amount), sale_type='hourly', payment_method=payment_method, cashier=self.cashier
+        )
+
+    def sale_return(self, sale, amount):
+        return SaleReturn.objects.create(sale=sale, amount=Decimal(amount), cashier=self.cashier)
+
+    def ledger(self):
+        """{(day, sale_type, payment_method): (sales_count, sales_amount, returns_count, returns_amount)}, empty rows left out"""
+        return {
+            (row.day, row.sale_type, row.payment_method): (row.sales_count, row.sales_amount, row.returns_count, row.returns_amount)
+            for row in DailyLedger.objects.exclude(sales_count=0, returns_count=0)
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.ledger()
+        rebuild_ledger()
+        self.assertEqual(self.ledger(), incremental)
+
+    def test_sale_and_return_are_recorded(self):
+        sale = self.sale('100.00')
+        self.sale_return(sale, '30.00')
+
+        self.assertEqual(self.ledger(), {(self.today, 'hourly', 'cash'): (1, 100, 1, 30)})
+        self.assertMatchesRebuild()
+
+    def test_edit_moves_the_totals(self):
+        sale = self.sale('100.00')
+        self.sale_return(sale, '30.00')
+
+        sale.date -= datetime.timedelta(days=1)
+        sale.payment_method = 'card'
+        sale.amount = Decimal('120.00')
+        sale.save()
+
+        # the return stays on the day it was made, under the sale's new method
+        self.assertEqual(self.ledger(), {
+            (self.yesterday, 'hourly', 'card'): (1, 120, 0, 0),
+            (self.today, 'hourly', 'card'): (0, 0, 1, 30),
+        })
+        self.assertMatchesRebuild()
+
+    def test_delete_removes_the_totals(self):
+        kept = self.sale('40.00')
+        sale = self.sale('100.00')
+        sale_return = self.sale_return(sale, '30.00')
+
+        sale_return.delete()
+        self.assertEqual(self.ledger(), {(self.today, 'hourly', 'cash'): (2, 140, 0, 0)})
+        sale.delete()
+        self.assertEqual(self.ledger(), {(self.today, 'hourly', 'cash'): (1, kept.amount, 0, 0)})
+        self.assertMatchesRebuild()
+
+    def test_cascade_delete_removes_the_returns(self):
+        sale = self.sale('100.00', payment_method='mobile_money')
+        self.sale_return(sale, '30.00')
+        self.sale_return(sale, '20.00')
+
+        sale.delete()
+
+        self.assertEqual(SaleReturn.objects.count(), 0)
+        self.assertEqual(self.ledger(), {})
+        self.assertMatchesRebuild()
+
+    def test_failed_ledger_update_rolls_back_the_return(self):
+        sale = self.sale('100.00')
+        api = APIClient()
+        api.force_authenticate(self.cashier)
+
+        with mock.patch('finance.signals.adjust_ledger', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            api.post('/finance/api/v1/sale-returns/', {'sale': sale.id, 'amount': '30.00', 'cashier': self.cashier.id})
+
+        self.assertFalse(SaleReturn.objects.exists())
+        self.assertEqual(self.ledger(), {(self.today, 'hourly', 'cash'): (1, 100, 0, 0)})
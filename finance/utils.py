@@ -0,0 +1,11 @@
+import datetime
+from django.utils import timezone
+
+
+def day_range(day):
+    """
+    Returns the aware [start, end) datetimes of a local calendar day.
+    Filtering Sale.date on this range can use sale_date_idx, date__date can't.
+    """
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
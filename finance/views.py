@@ -5,10 +5,13 @@ from django.template.loader import render_to_string
 from django.db import transaction
 import datetime
 from finance.models import Sale
-from .tasks import(
-    send_eod_email,
-    generate_eod_pdf
-)
+from management.pagination import KeysetPaginator
+from management.cache import cached
+from .utils import day_range
+from .reports import day_report, eod_report, eod_fields
+from .downloads import serve_file
+from django.utils import timezone
+from .tasks import eod_report_pipeline
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
@@ -18,44 +21,41 @@ from django.shortcuts import get_object_or_404
 @login_required
 def end_of_day(request):
     """
-        Retrieves all the end of day objects with pagination (20 items per page)
+        Retrieves all the end of day objects with keyset pagination (20 items per page)
         Returns JSON response for AJAX requests or renders the full template for direct access
     """
     if request.method == 'GET':
-        page = int(request.GET.get('page', 1))
+        cursor = request.GET.get('cursor')
         query = request.GET.get('q', '')
-        page_size = 20
 
 
-        eod_list = EndOfDay.objects.all().order_by('-date')
+        eod_list = EndOfDay.objects.all()
         if query:
             eod_list = eod_list.filter(date__icontains=query)
     
 
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        paginated_eods = eod_list[start:end]
-        total_eods = eod_list.count()
-        has_more = total_eods > end
+        paginated_eods, has_more, next_cursor = KeysetPaginator(
+            eod_list,
+            ordering=('-date', '-id')
+        ).page(cursor)
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             html = render_to_string(
                 'end_of_day/partials/eod_items.html',
-                {'end_of_day': paginated_eods}
+                {'eods': paginated_eods}
             )
             
             return JsonResponse({
                 'html': html,
                 'has_more': has_more,
-                'next_page': page + 1 if has_more else None
+                'next_cursor': next_cursor
             })
         
 
         return render(request, 'end_of_day/end_of_day_list.html', {
             'eods': paginated_eods,
             'has_more': has_more,
-            'next_page': page + 1 if has_more else None
+            'next_cursor': next_cursor
         })
     
 
@@ -65,30 +65,20 @@ def end_of_day(request):
         """
         try:
             with transaction.atomic():
-                sales = Sale.objects.filter(date__date=datetime.date.today()).select_related(
-                    'cashier',
-                    'client'
-                )
-
-                eod = EndOfDay.objects.create(date=datetime.datetime.today(), amount=0)
-
-                eod_items = []
-                total_sales_amount = 0
-                for sale in sales:
-                    eod_items.append(
-                        EndOfDayItem(
-                            eod=eod,
-                            sale=sale
-                        )
-                    )
-                    total_sales_amount += sale.amount
-                
-                EndOfDayItem.objects.bulk_create(eod_items)
-                eod.amount = total_sales_amount
-                eod.save()
-
-                generate_eod_pdf.delay(eod.id)
-                send_eod_email.delay(eod.id)
+                # totals come from the day's ledger rows, the same report the
+                # pdf and email are rendered from; only the sale ids are read
+                today = timezone.localdate()
+                start, end = day_range(today)
+
+                eod = EndOfDay.objects.create(date=today, **eod_fields(day_report(today)))
+                EndOfDayItem.objects.bulk_create([
+                    EndOfDayItem(eod=eod, sale_id=sale_id)
+                    for sale_id in Sale.objects.filter(date__gte=start, date__lt=end).values_list('id', flat=True)
+                ])
+
+                # the workers must see the committed EOD; the pdf is rendered
+                # once and the email waits for it
+                transaction.on_commit(lambda: eod_report_pipeline(eod.id).delay())
 
                 return redirect('finance:end_of_day')
             
@@ -99,10 +89,8 @@ def end_of_day(request):
 @login_required
 def eod_detail(request, id):
     try:
-        data = list(EndOfDayItem.objects.filter(eod__id=id).values(
-            'sale__sale_type',
-            'sale__amount'
-        ))
+        # totals per sale type and payment method, net of returns
+        data = cached('eod', (id,), lambda: eod_report(id)['rows'])
         return JsonResponse(data, safe=False)
     except Exception as e:
         return JsonResponse({'succes':False, 'message':f'{e}'}, status=400)
@@ -110,16 +98,21 @@ def eod_detail(request, id):
 
 
 @login_required
-def download_eod_pdf(requset, id):
+def download_eod_pdf(request, id):
     """
-        Download pdf file for the eod
+        Download pdf file for the eod, streamed with range and conditional
+        request support (see finance.downloads.serve_file)
     """
     eod = get_object_or_404(EndOfDay, id=id)
 
     if eod.pdf:
-        response = HttpResponse(eod.pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="End_of_day_{id}.pdf"'
-        return response
+        return serve_file(
+            request,
+            eod.pdf,
+            f"End_of_day_{id}.pdf",
+            etag=eod.report_hash or None,
+            content_type='application/pdf',
+        )
     else:
         return HttpResponse("No PDF found for this delivery note.", status=404) 
 
@@ -0,0 +1,136 @@
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+# namespaces reported by cache_stats(); the first part of every key
+NAMESPACES = ('categories', 'voucher-status', 'dashboard', 'eod', 'auth-token')
+# namespaces the celery workers invalidate (expiry sweep, usage ingest,
+# pfSense sync, file population, eod pipeline). A per-process cache never
+# sees those invalidations, so they are only cached when the cache is shared.
+WORKER_NAMESPACES = ('voucher-status', 'dashboard', 'eod')
+STATS_KEY = 'cache-stats:{namespace}:{outcome}'
+
+_MISSING = object()
+
+
+def cache_key(namespace, *parts):
+    return ':'.join([namespace, *map(str, parts)])
+
+
+def is_cached(namespace):
+    """False for worker-changed namespaces when every process has its own cache"""
+    return namespace not in WORKER_NAMESPACES or not isinstance(caches['default'], LocMemCache)
+
+
+def _count(namespace, outcome, n=1):
+    if not n:
+        return
+    key = STATS_KEY.format(namespace=namespace, outcome=outcome)
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        # first hit/miss of the namespace, or the counter was evicted
+        if not cache.add(key, n, None):
+            cache.incr(key, n)
+
+
+def cached(namespace, parts, compute, timeout=None, cache_none=True):
+    """
+    Read-through lookup: returns the cached value for namespace + parts, or
+    calls compute(), caches and returns its result. Hits and misses are
+    counted per namespace. `timeout` defaults to the cache's TIMEOUT; with
+    cache_none=False a None result is returned without being stored.
+    Namespaces is_cached() leaves out are computed every time.
+    """
+    if not is_cached(namespace):
+        return compute()
+    key = cache_key(namespace, *parts)
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count(namespace, 'hits')
+        return value
+
+    _count(namespace, 'misses')
+    value = compute()
+    if value is None and not cache_none:
+        return value
+    if timeout is None:
+        cache.set(key, value)
+    else:
+        cache.set(key, value, timeout)
+    return value
+
+
+def cached_many(namespace, parts_list, compute_missing, timeout=None, cache_none=True):
+    """
+    Batch read-through: `parts_list` is a list of single key parts. Reads every
+    key with one get_many, calls compute_missing(missing_parts) once for the
+    misses, which returns {part: value}, and stores those with one set_many.
+    Returns {part: value}; parts compute_missing leaves out map to None.
+    """
+    if not is_cached(namespace):
+        computed = compute_missing(list(parts_list))
+        return {part: computed.get(part) for part in parts_list}
+    keys = {cache_key(namespace, part): part for part in parts_list}
+    found = cache.get_many(keys.keys())
+    values = {keys[key]: value for key, value in found.items()}
+
+    missing = [part for key, part in keys.items() if key not in found]
+    _count(namespace, 'hits', len(found))
+    _count(namespace, 'misses', len(missing))
+    if missing:
+        computed = compute_missing(missing)
+        to_store = {}
+        for part in missing:
+            value = computed.get(part)
+            values[part] = value
+            if value is not None or cache_none:
+                to_store[cache_key(namespace, part)] = value
+        if timeout is None:
+            cache.set_many(to_store)
+        else:
+            cache.set_many(to_store, timeout)
+    return values
+
+
+def invalidate(namespace, *parts_list):
+    """
+    Drops cached entries, each given as a tuple of key parts (or a single part).
+
+    The delete runs when the current transaction commits: dropping the entry
+    earlier would let a concurrent reader cache the old row again before the
+    change is visible.
+    """
+    keys = [
+        cache_key(namespace, *(parts if isinstance(parts, tuple) else (parts,)))
+        for parts in parts_list
+    ]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def cache_stats():
+    """{namespace: {'hits': n, 'misses': n, 'hit_rate': float}}"""
+    keys = {
+        (namespace, outcome): STATS_KEY.format(namespace=namespace, outcome=outcome)
+        for namespace in NAMESPACES for outcome in ('hits', 'misses')
+    }
+    values = cache.get_many(keys.values())
+
+    stats = {}
+    for namespace in NAMESPACES:
+        hits = values.get(keys[(namespace, 'hits')], 0)
+        misses = values.get(keys[(namespace, 'misses')], 0)
+        stats[namespace] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return stats
+
+
+def reset_cache_stats():
+    cache.delete_many([
+        STATS_KEY.format(namespace=namespace, outcome=outcome)
+        for namespace in NAMESPACES for outcome in ('hits', 'misses')
+    ])
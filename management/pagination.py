@@ -0,0 +1,67 @@
+import base64
+import json
+from django.db.models import Q
+
+
+class KeysetPaginator:
+    """
+    Keyset (cursor) pagination for the infinite-scroll views.
+
+    Pages are selected with a WHERE on the ordering keys of the last row seen
+    instead of OFFSET, and has_more comes from fetching one extra row, so a
+    deep page costs the same as the first one and no count() is needed.
+    The ordering must end in a unique field (normally '-id').
+    """
+
+    def __init__(self, queryset, ordering=('-date_created', '-id'), page_size=20):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = ordering
+        self.page_size = page_size
+        self.fields = [key.lstrip('-') for key in ordering]
+
+    def encode_cursor(self, obj):
+        # rows from values() querysets are dicts
+        if isinstance(obj, dict):
+            values = [obj[field] for field in self.fields]
+        else:
+            values = [getattr(obj, field) for field in self.fields]
+        # isoformat keeps microseconds, which DjangoJSONEncoder would drop
+        data = json.dumps(values, default=lambda value: value.isoformat()).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, cursor):
+        """Returns the key values in a cursor, or None when it can't be read"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                return None
+            opts = self.queryset.model._meta
+            return [opts.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            return None
+
+    def after(self, values):
+        """Q for the rows that come after the given key values"""
+        condition = Q()
+        for i, key in enumerate(self.ordering):
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            clause = Q(**{f'{self.fields[i]}__{lookup}': values[i]})
+            for field, value in zip(self.fields[:i], values[:i]):
+                clause &= Q(**{field: value})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Returns (items, has_more, next_cursor) for the page after the cursor
+        """
+        queryset = self.queryset
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None:
+            queryset = queryset.filter(self.after(values))
+
+        items = list(queryset[:self.page_size + 1])
+        has_more = len(items) > self.page_size
+        items = items[:self.page_size]
+        next_cursor = self.encode_cursor(items[-1]) if has_more else None
+        return items, has_more, next_cursor
@@ -7,6 +7,7 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.dashboard, name='dashboard'),
+    path('cache/stats/', views.cacheStats, name='cacheStats'),
     path('users/', include('users.urls', namespace='users')),
     path('vouchers/', include('vouchers.urls', namespace='vouchers')),
     path('finance/', include('finance.urls', namespace='finance')),
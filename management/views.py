@@ -3,6 +3,11 @@ from vouchers.models import *
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required 
 from finance.models import Sale
+from finance.utils import day_range
+from vouchers.inventory import inventory_summary
+from management.cache import cached, cache_stats, reset_cache_stats
+from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Sum
 from datetime import timedelta
 from django.utils import timezone
@@ -15,28 +20,48 @@ today = datetime.datetime.today()
 def dashboard(request): 
     filter = request.GET.get('filter', '')
     start_day = request.GET.get('start', '')
-    end_day = request.GET.get('filter', '')
+    end_day = request.GET.get('end', '')
 
     vouchers = VoucherUser.objects.filter(date_created = date.today())
 
-    total_sales = sales(filter, start_day, end_day)
+    if filter == 'custom':
+        total_sales = sales(filter, start_day, end_day)
+    else:
+        total_sales = cached('dashboard', ('sales', filter or 'all'), lambda: sales(filter))
+    today_key = timezone.localdate()
 
     return render(request, 'dashboard.html', {
         'vouchers':vouchers,
         'count':vouchers.count(),
+        'inventory':cached('dashboard', ('inventory',), inventory_summary),
+        'inventory_statuses':Vouchers.STATUS_CHOICES,
         
         #totals
-        'todays_sales':Sale.objects.filter(date__date=today).aggregate(Sum('amount'))['amount__sum'] or 0.00,
+        'todays_sales':cached('dashboard', ('todays_sales', today_key), lambda: todays_sales(today_key)),
         'total_sales':total_sales
     })
 
 
+@staff_member_required
+def cacheStats(request):
+    """Cache hits and misses per namespace; POST resets the counters"""
+    if request.method == 'POST':
+        reset_cache_stats()
+    return JsonResponse(cache_stats())
+
+
+def todays_sales(day):
+    day_start, day_end = day_range(day)
+    return Sale.objects.filter(date__gte=day_start, date__lt=day_end).aggregate(Sum('amount'))['amount__sum'] or 0.00
+
+
 def sales(filter, start_day=None, end_day=None):
     
     if filter == 'week':
         start_of_week = today - timedelta(days=today.weekday())  
         end_of_week = start_of_week + timedelta(days=6) 
-
+        week_start, week_end = day_range(start_of_week.date())[0], day_range(end_of_week.date())[1]
+        total_sales = Sale.objects.filter(date__gte=week_start, date__lt=week_end).aggregate(Sum('amount'))['amount__sum']
         return total_sales if total_sales else 0
     
     elif filter == 'month':
@@ -0,0 +1,43 @@
+import hashlib
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from management.cache import cached, invalidate
+
+AUTH_TOKEN_CACHE_TIMEOUT = getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 300)
+
+
+def token_cache_part(key):
+    # keys are credentials, keep them out of cache key names
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    DRF token authentication ("Authorization: Token <key>") with the token and
+    its user read through the cache, so integrations polling the API at high
+    rates (captive portals) don't cost a query per request. Tokens are
+    dropped from the cache when deleted or when their user is saved.
+    """
+
+    def authenticate_credentials(self, key):
+        token = cached(
+            'auth-token',
+            (token_cache_part(key),),
+            lambda: Token.objects.select_related('user').filter(key=key).first(),
+            timeout=AUTH_TOKEN_CACHE_TIMEOUT,
+            cache_none=False,
+        )
+        if token is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
+
+
+def invalidate_tokens(keys):
+    invalidate('auth-token', *map(token_cache_part, keys))
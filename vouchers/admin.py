@@ -7,3 +7,6 @@ admin.site.register(VoucherLogs)
 admin.site.register(VoucherUser)
 admin.site.register(VoucherCategory)
 
+admin.site.register(VoucherInventory)
+admin.site.register(VoucherLogArchive)
+admin.site.register(ExpirySweep)
@@ -1,11 +1,25 @@
 from rest_framework import status, viewsets, filters
 from rest_framework.views import APIView
+from rest_framework.decorators import action
+from rest_framework.authentication import SessionAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import *
 from .serializers import *
 from .permissions import IsAdminOrReadOnly
+from .expiry import expiry_metrics
+from .inventory import inventory_summary
+from .caching import voucher_status, voucher_statuses
+from .pfsense import gateway_stats
+from .usage import ingest_records, ingest_lines
+from .archive import archive_horizon, archived_logs
+from .search import search_logs
+from .audit import activity_summary
+from users.authentication import CachedTokenAuthentication
+from users.models import User
+from management.pagination import KeysetPaginator
 
 
 class VoucherFileViewSet(viewsets.ModelViewSet):
@@ -17,17 +31,33 @@ class VoucherFileViewSet(viewsets.ModelViewSet):
     serializer_class = VoucherFileSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'created_at']
-    search_fields = ['name', 'description']
-    ordering_fields = ['created_at', 'name']
+    filterset_fields = ['category', 'status', 'date_created']
+    search_fields = ['name']
+    ordering_fields = ['date_created', 'name']
+
+    @action(
+        detail=True,
+        methods=['get'],
+        authentication_classes=[JWTAuthentication, SessionAuthentication],
+    )
+    def progress(self, request, pk=None):
+        """
+        Import progress for a voucher file, polled by the voucher files page
+        """
+        voucher_file = self.get_object()
+        serializer = VoucherFileProgressSerializer(voucher_file)
+        return Response(serializer.data)
 
 
 class VoucherListAPIView(APIView):
     """
     API endpoint for listing unused vouchers.
-    Allows filtering by file category.
+    Allows filtering by file category, keyset pagination through `cursor`
+    and `page_size`, and projection with `fields=voucher_no,file_category`.
     """
     permission_classes = [IsAuthenticated]
+    page_size = 100
+    max_page_size = 500
 
     def get(self, request):
         vouchers = Vouchers.objects.filter(status='unused')
@@ -35,23 +65,211 @@ class VoucherListAPIView(APIView):
         
         if category:
             vouchers = vouchers.filter(file__category=category)
-            
-        serializer = VouchersSerializer(vouchers, many=True)
-        return Response(serializer.data)
+
+        fields = [field for field in request.query_params.get('fields', '').split(',') if field]
+        unknown = set(fields) - set(VOUCHER_LIST_FIELDS)
+        if unknown:
+            return Response(
+                {"fields": [f"Unknown fields: {', '.join(sorted(unknown))}"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            page_size = min(int(request.query_params.get('page_size', self.page_size)), self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+
+        serializer = VoucherListSerializer(fields)
+        # the cursor keys are always selected, even when not projected
+        rows = vouchers.values(*set(serializer.lookups()) | {'date_created', 'id'})
+        page, has_more, next_cursor = KeysetPaginator(rows, page_size=max(page_size, 1)).page(
+            request.query_params.get('cursor')
+        )
+
+        return Response({
+            'results': [serializer.to_representation(row) for row in page],
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+        })
+
+
+class ExpiryMetricsAPIView(APIView):
+    """
+    API endpoint for the voucher expiry sweep.
+    Returns the current expiry backlog (count and lag) and the last sweep result.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(expiry_metrics())
+
+
+class VoucherInventoryAPIView(APIView):
+    """
+    API endpoint for the voucher inventory.
+    Returns the maintained voucher counts per category and status.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(inventory_summary())
+
+
+class PfSenseSyncStatsAPIView(APIView):
+    """
+    API endpoint for the pfSense sync.
+    Returns each gateway's last sync, throughput, pending vouchers and backoff state.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(gateway_stats())
+
+
+class VoucherStatusAPIView(APIView):
+    """
+    API endpoint for voucher status lookups by captive portals and other integrations.
+    Authenticates with a DRF token or a JWT and answers from the voucher status cache,
+    with a single joined query on a miss.
+    """
+    authentication_classes = [CachedTokenAuthentication, JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, voucher_no):
+        data = voucher_status(voucher_no)
+        if data is None:
+            return Response({"error": "Voucher not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+
+class VoucherStatusBatchAPIView(APIView):
+    """
+    API endpoint for batch voucher status lookups.
+    POST {"voucher_nos": [...]} (up to 500) returns {voucher_no: status document or null};
+    cache misses are resolved in one joined IN query.
+    """
+    authentication_classes = [CachedTokenAuthentication, JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = VoucherStatusBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        voucher_nos = serializer.validated_data['voucher_nos']
+
+        statuses = voucher_statuses(voucher_nos)
+        return Response({voucher_no: statuses[voucher_no] for voucher_no in voucher_nos})
+
+
+class UsageIngestAPIView(APIView):
+    """
+    API endpoint for captive portal usage.
+    POST {"records": [...]} and/or {"lines": [...]} (up to 10000 each) marks the
+    vouchers used and records the device; returns the ingestion counts.
+    Replayed sessions change nothing.
+    """
+    authentication_classes = [CachedTokenAuthentication, JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = UsageIngestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        counts = {}
+        if serializer.validated_data.get('records'):
+            counts['records'] = ingest_records(serializer.validated_data['records'])
+        if serializer.validated_data.get('lines'):
+            counts['lines'] = ingest_lines(serializer.validated_data['lines'])
+        return Response(counts)
 
 
 class VoucherLogViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for voucher logs.
     Read-only operations to maintain audit integrity.
+    `start` and `end` (dates or datetimes) limit the list to a range, paged
+    with `cursor` and `page_size` like the voucher list; entries of the range
+    already moved to the archive are read back from its files.
+    `search` keeps the entries whose message or username contains it.
     """
-    queryset = VoucherLogs.objects.all()
+    queryset = VoucherLogs.objects.select_related('user', 'category')
     serializer_class = VoucherLogsSerializer
     permission_classes = [IsAuthenticated]
+    page_size = 100
+    max_page_size = 500
     # filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     # filterset_fields = ['voucher', 'user', 'action_type', 'created_at']
     ordering_fields = ['created_at']
 
+    def get_queryset(self):
+        return search_logs(super().get_queryset(), self.request.query_params.get('search', ''))
+
+    def list(self, request, *args, **kwargs):
+        date_range = LogRangeSerializer(data=request.query_params)
+        date_range.is_valid(raise_exception=True)
+        start = date_range.validated_data.get('start')
+        end = date_range.validated_data.get('end')
+        if start is None and end is None:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            page_size = min(int(request.query_params.get('page_size', self.page_size)), self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+        page_size = max(page_size, 1)
+
+        logs = self.filter_queryset(self.get_queryset()).select_related('user')
+        if start:
+            logs = logs.filter(date_created__gte=start)
+        if end:
+            logs = logs.filter(date_created__lte=end)
+        paginator = KeysetPaginator(logs, ordering=('-date_created', '-id'), page_size=page_size)
+        cursor = request.query_params.get('cursor')
+        page, has_more, _ = paginator.page(cursor)
+
+        # archived entries are older than the horizon: the files are only
+        # read when the page reaches back that far
+        archived = []
+        horizon = archive_horizon()
+        if horizon and (start is None or start <= horizon) and not (has_more and page[-1].date_created > horizon):
+            archived = archived_logs(
+                start, end,
+                search=request.query_params.get('search'),
+                before=paginator.decode_cursor(cursor) if cursor else None,
+                limit=page_size + 1,
+            )
+
+        entries = sorted(page + archived, key=self._log_key, reverse=True)
+        has_more = has_more or len(entries) > page_size
+        entries = entries[:page_size]
+
+        users = User.objects.in_bulk({entry['user_id'] for entry in entries if isinstance(entry, dict) and entry['user_id']})
+        return Response({
+            'results': [
+                ArchivedLogSerializer(entry, context={'users': users}).data if isinstance(entry, dict)
+                else self.get_serializer(entry).data
+                for entry in entries
+            ],
+            'has_more': has_more,
+            'next_cursor': paginator.encode_cursor(entries[-1]) if has_more else None,
+        })
+
+    @staticmethod
+    def _log_key(entry):
+        # log rows and archived entries (dicts) in one (date_created, id) order
+        if isinstance(entry, dict):
+            return entry['date_created'], entry['id']
+        return entry.date_created, entry.id
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Entries and vouchers per category and action type, `start`/`end` as for the list"""
+        date_range = LogRangeSerializer(data=request.query_params)
+        date_range.is_valid(raise_exception=True)
+        return Response(activity_summary(
+            date_range.validated_data.get('start'),
+            date_range.validated_data.get('end'),
+        ))
+
 
 class VoucherCategoryViewSet(viewsets.ModelViewSet):
     """
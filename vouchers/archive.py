@@ -0,0 +1,165 @@
+import gzip
+import heapq
+import json
+import tempfile
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from loguru import logger
+from .models import VoucherLogs, VoucherLogArchive, render_log_message
+from .search import entry_matches
+
+LOG_RETENTION_DAYS = getattr(settings, 'VOUCHER_LOG_RETENTION_DAYS', 90)
+ARCHIVE_CHUNK_SIZE = 2000
+
+
+def _month_start(moment):
+    moment = timezone.localtime(moment)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month):
+    return timezone.make_aware(datetime(month.year + month.month // 12, month.month % 12 + 1, 1))
+
+
+def _archive_month(month, upper):
+    """
+    Writes the entries of `month` older than `upper` to one archive file, then
+    deletes them. Returns the VoucherLogArchive, None when there was nothing.
+    """
+    entries = VoucherLogs.objects.filter(date_created__gte=month, date_created__lt=upper)
+    bounds = entries.aggregate(first_id=Min('id'), last_id=Max('id'), start=Min('date_created'), end=Max('date_created'))
+    if bounds['first_id'] is None:
+        return None
+    entries = entries.filter(id__lte=bounds['last_id'])
+
+    rows = 0
+    with tempfile.TemporaryFile() as spool:
+        with gzip.GzipFile(fileobj=spool, mode='wb') as archive_file:
+            for entry in (
+                entries.order_by('id')
+                .values('id', 'date_created', 'user_id', 'user__username', 'action', 'action_type', 'event',
+                        'voucher_id', 'category_id', 'category__name', 'count', 'target', 'ip_address')
+                .iterator(chunk_size=ARCHIVE_CHUNK_SIZE)
+            ):
+                entry['date_created'] = entry['date_created'].isoformat()
+                entry['username'] = entry.pop('user__username')
+                entry['category_name'] = entry.pop('category__name')
+                archive_file.write(json.dumps(entry).encode() + b'\n')
+                rows += 1
+
+        spool.seek(0)
+        archive = VoucherLogArchive(
+            month=month.date(),
+            row_count=rows,
+            start=bounds['start'],
+            end=bounds['end'],
+            first_id=bounds['first_id'],
+            last_id=bounds['last_id'],
+        )
+        archive.file.save(
+            f"voucher-logs-{month:%Y-%m}-{bounds['first_id']}-{bounds['last_id']}.jsonl.gz",
+            File(spool),
+            save=False,
+        )
+
+    try:
+        with transaction.atomic():
+            archive.save()
+            entries.delete()
+    except Exception:
+        archive.file.delete(save=False)
+        raise
+    return archive
+
+
+def archive_logs(retention_days=LOG_RETENTION_DAYS, now=None):
+    """
+    Moves VoucherLogs older than retention_days to gzipped JSONL files, one
+    per month per run, so the table only holds the recent window. A file is
+    written before its entries are deleted, and recorded in the same
+    transaction as the delete. Returns [(month, entries archived)].
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+    oldest = VoucherLogs.objects.filter(date_created__lt=cutoff).aggregate(oldest=Min('date_created'))['oldest']
+    if oldest is None:
+        return []
+
+    archived = []
+    month = _month_start(oldest)
+    while month < cutoff:
+        following = _next_month(month)
+        archive = _archive_month(month, min(following, cutoff))
+        if archive:
+            archived.append((archive.month, archive.row_count))
+            logger.info(f"Archived {archive.row_count} voucher logs of {month:%Y-%m} to {archive.file.name}")
+        month = following
+    return archived
+
+
+def archive_horizon():
+    """Newest archived entry time: logs before it may be in the archive, None when there is none"""
+    return VoucherLogArchive.objects.aggregate(end=Max('end'))['end']
+
+
+def archived_message(entry):
+    """Display text of an archived entry, see VoucherLogs.message"""
+    return render_log_message(
+        entry.get('event'),
+        entry['action'],
+        username=entry['username'],
+        target=entry.get('target'),
+        count=entry.get('count'),
+        category=entry.get('category_name'),
+    )
+
+
+def archived_logs(start=None, end=None, search=None, before=None, limit=None):
+    """
+    Entries from the archive files overlapping [start, end], as dicts of the
+    VoucherLogs columns plus username and category_name (files written before
+    the structured fields lack them), newest first. `search` keeps those
+    matching it like vouchers.search.search_logs.
+
+    `before` is a (date_created, id) page cursor: only entries older than it
+    are returned. With `limit` at most that many entries, the newest, are
+    returned and held in memory: files are streamed newest first and no
+    more are opened once none of their entries could be newer than those
+    kept.
+    """
+    archives = VoucherLogArchive.objects.all()
+    if start:
+        archives = archives.filter(end__gte=start)
+    if end:
+        archives = archives.filter(start__lte=end)
+    if before:
+        archives = archives.filter(start__lte=before[0])
+
+    # (date_created, id, entry): a min-heap of the newest entries when limited
+    kept = []
+    for archive in archives.order_by('-end', '-last_id'):
+        if limit and len(kept) >= limit and archive.end < kept[0][0]:
+            break
+        with archive.file.open('rb') as stored, gzip.GzipFile(fileobj=stored) as archive_file:
+            for line in archive_file:
+                entry = json.loads(line)
+                entry['date_created'] = parse_datetime(entry['date_created'])
+                key = (entry['date_created'], entry['id'])
+                if (start and key[0] < start) or (end and key[0] > end) or (before and key >= tuple(before)):
+                    continue
+                if limit and len(kept) >= limit and key < kept[0][:2]:
+                    continue
+                if search and not entry_matches(entry, search):
+                    continue
+                if not limit:
+                    kept.append((*key, entry))
+                elif len(kept) < limit:
+                    heapq.heappush(kept, (*key, entry))
+                else:
+                    heapq.heappushpop(kept, (*key, entry))
+    kept.sort(key=lambda item: item[:2], reverse=True)
+    return [entry for _, _, entry in kept]
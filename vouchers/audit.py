@@ -0,0 +1,104 @@
+import threading
+import weakref
+from django.db import router, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from loguru import logger
+from .models import VoucherLogs
+
+LOG_BATCH_SIZE = 500
+
+_local = threading.local()
+
+
+class _LogBuffer:
+    """
+    Log entries of one transaction (or savepoint), written by flush() when it
+    commits. Only the on_commit callback holds the buffer strongly: when Django
+    drops the callback on rollback, the entries go with it.
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.entries = []
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        try:
+            VoucherLogs.objects.using(self.using).bulk_create(entries, batch_size=LOG_BATCH_SIZE)
+        except Exception:
+            # the change itself is committed, don't fail the request over its log
+            logger.exception(f"Could not write {len(entries)} voucher log entries")
+
+
+def _buffer():
+    """The buffer of the current transaction and savepoint, None outside a transaction"""
+    using = router.db_for_write(VoucherLogs)
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = weakref.WeakValueDictionary()
+    key = (using, tuple(connection.savepoint_ids))
+    buffer = buffers.get(key)
+    if buffer is None:
+        buffer = buffers[key] = _LogBuffer(using)
+        transaction.on_commit(buffer.flush, using=using)
+    return buffer
+
+
+def log_many(entries):
+    """
+    Queues unsaved VoucherLogs for the current transaction; they are inserted
+    with one bulk_create when it commits and dropped if it rolls back. Outside
+    a transaction they are inserted right away.
+    """
+    entries = list(entries)
+    if not entries:
+        return
+    buffer = _buffer()
+    if buffer is None:
+        VoucherLogs.objects.bulk_create(entries, batch_size=LOG_BATCH_SIZE)
+    else:
+        buffer.entries.extend(entries)
+
+
+def log(event, action_type, **fields):
+    """
+    Queues one VoucherLogs entry for `event` (see VoucherLogs.EVENT_MESSAGES),
+    other fields as on the model; see log_many
+    """
+    for field in ('action', 'target'):
+        if fields.get(field):
+            fields[field] = fields[field][:200]
+    log_many([VoucherLogs(event=event, action_type=action_type, **fields)])
+
+
+def activity_summary(start=None, end=None):
+    """
+    Entries and vouchers affected per category and action type over a period,
+    grouped on the voucherlogs_category_type_idx columns:
+    [{'category': id or None, 'category_name', 'action_type', 'entries', 'vouchers'}]
+    """
+    logs = VoucherLogs.objects.all()
+    if start:
+        logs = logs.filter(date_created__gte=start)
+    if end:
+        logs = logs.filter(date_created__lte=end)
+    rows = (
+        logs.order_by().values('category', 'category__name', 'action_type')
+        .annotate(entries=Count('id'), vouchers=Sum(Coalesce('count', 1)))
+        .order_by('category__name', 'action_type')
+    )
+    return [
+        {
+            'category': row['category'],
+            'category_name': row['category__name'],
+            'action_type': row['action_type'],
+            'entries': row['entries'],
+            'vouchers': row['vouchers'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,69 @@
+from management.cache import cached, cached_many, invalidate
+from .models import Vouchers, VoucherCategory, VoucherUser
+
+
+def category_list():
+    """All categories as [{'id': ..., 'name': ...}], cached until a category changes"""
+    return cached('categories', ('all',), lambda: list(VoucherCategory.objects.order_by('id').values('id', 'name')))
+
+
+def invalidate_categories():
+    invalidate('categories', 'all')
+
+
+def voucher_status_payload(voucher):
+    """The status document served for a voucher, `voucher` having file__category selected"""
+    data = {
+        'voucher_no': voucher.voucher_no,
+        'status': voucher.status,
+        'active': voucher.active,
+        'validity_duration': voucher.validity_duration,
+        'expiry_time': voucher.expiry_time.isoformat() if voucher.expiry_time else None,
+        'category': voucher.file.category.name,
+        'date_created': voucher.date_created.isoformat(),
+        'date_used': voucher.date_used.isoformat() if voucher.date_used else None,
+        'date_printed': voucher.date_printed.isoformat() if voucher.date_printed else None,
+    }
+
+    try:
+        voucher_user = voucher.voucher_user
+    except VoucherUser.DoesNotExist:
+        voucher_user = None
+    if voucher_user:
+        data['user'] = {
+            'name': voucher_user.name,
+            'phone': voucher_user.phonenumber,
+            'email': voucher_user.email,
+        }
+    return data
+
+
+def voucher_status(voucher_no):
+    """
+    Cached status document of a voucher, None when it does not exist.
+    Unknown numbers are not cached, so a later import needs no invalidation.
+    """
+    def lookup():
+        voucher = (
+            Vouchers.objects.select_related('file__category', 'voucher_user')
+            .filter(voucher_no=voucher_no).first()
+        )
+        return voucher_status_payload(voucher) if voucher else None
+
+    return cached('voucher-status', (voucher_no,), lookup, cache_none=False)
+
+
+def voucher_statuses(voucher_nos):
+    """
+    Cached status documents of many vouchers: {voucher_no: document or None}.
+    Cache misses are resolved together in one IN query.
+    """
+    def lookup(missing):
+        vouchers = Vouchers.objects.select_related('file__category', 'voucher_user').filter(voucher_no__in=missing)
+        return {voucher.voucher_no: voucher_status_payload(voucher) for voucher in vouchers}
+
+    return cached_many('voucher-status', voucher_nos, lookup, cache_none=False)
+
+
+def invalidate_voucher_status(voucher_nos):
+    invalidate('voucher-status', *voucher_nos)
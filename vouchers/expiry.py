@@ -0,0 +1,122 @@
+import time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from loguru import logger
+from .models import Vouchers, VoucherLogs, ExpirySweep
+from .inventory import move_inventory, status_counts
+from .caching import invalidate_voucher_status
+from .journal import record_changes
+from . import audit
+
+EXPIRY_BATCH_SIZE = getattr(settings, 'VOUCHER_EXPIRY_BATCH_SIZE', 500)
+# metrics kept in the ExpirySweep row, next to swept_at
+SWEEP_FIELDS = ('expired', 'batches', 'pending_before', 'lag_seconds', 'duration_seconds')
+
+
+def expiry_backlog(now=None):
+    """
+    Active vouchers already past expiry_time and how far behind the oldest one is.
+    Served by the vouchers_expiring_idx partial index.
+    """
+    now = now or timezone.now()
+    backlog = Vouchers.objects.filter(active=True, expiry_time__lte=now).aggregate(
+        pending=Count('id'),
+        oldest=Min('expiry_time'),
+    )
+    return {
+        'pending': backlog['pending'],
+        'lag_seconds': (now - backlog['oldest']).total_seconds() if backlog['oldest'] else 0,
+    }
+
+
+def expire_vouchers(now=None, batch_size=EXPIRY_BATCH_SIZE):
+    """
+    Deactivates and marks expired every active voucher past its expiry_time.
+
+    Works in batches of ids taken from the expiring index: one UPDATE, one
+    bulk insert of 'expire' logs at commit and journal entries, and the inventory move
+    per batch. Returns the sweep metrics, which
+    are also stored in the ExpirySweep row for the metrics endpoint.
+    """
+    started = time.monotonic()
+    now = now or timezone.now()
+    backlog = expiry_backlog(now)
+
+    expired = 0
+    batches = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Vouchers.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(active=True, expiry_time__lte=now)
+                .order_by('expiry_time')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            # rows stay locked until the batch commits, so the ones still
+            # active are the ones the UPDATE changes, and their statuses the
+            # ones it replaces for the inventory; only those are journaled
+            # and logged
+            changed = list(
+                Vouchers.objects.filter(id__in=ids, active=True)
+                .values_list('id', 'voucher_no', 'file__category_id')
+            )
+            changed_ids = [voucher_id for voucher_id, _, _ in changed]
+            counts = status_counts(Vouchers.objects.filter(id__in=changed_ids))
+            expired += Vouchers.objects.filter(id__in=changed_ids, active=True).update(
+                active=False, status='expired', synced_to_pfsense=False
+            )
+            move_inventory(counts, 'expired')
+            record_changes(changed_ids)
+            invalidate_voucher_status(voucher_no for _, voucher_no, _ in changed)
+            audit.log_many(
+                VoucherLogs(
+                    event='voucher_expired',
+                    action_type='expire',
+                    voucher_id=voucher_id,
+                    category_id=category_id,
+                    target=voucher_no,
+                )
+                for voucher_id, voucher_no, category_id in changed
+            )
+        batches += 1
+
+    metrics = {
+        'expired': expired,
+        'batches': batches,
+        'pending_before': backlog['pending'],
+        'lag_seconds': backlog['lag_seconds'],
+        'duration_seconds': round(time.monotonic() - started, 3),
+        'swept_at': now.isoformat(),
+    }
+    ExpirySweep.objects.update_or_create(id=1, defaults={
+        'swept_at': now,
+        **{field: metrics[field] for field in SWEEP_FIELDS},
+    })
+
+    if expired:
+        logger.info(f"Expired {expired} vouchers: {metrics}")
+    return metrics
+
+
+def last_sweep():
+    """Metrics of the last sweep, as expire_vouchers returned them; None before the first one"""
+    sweep = ExpirySweep.objects.filter(id=1).first()
+    if sweep is None:
+        return None
+    return {
+        **{field: getattr(sweep, field) for field in SWEEP_FIELDS},
+        'swept_at': sweep.swept_at.isoformat(),
+    }
+
+
+def expiry_metrics():
+    """Current backlog plus the result of the last sweep"""
+    return {
+        'backlog': expiry_backlog(),
+        'last_sweep': last_sweep(),
+    }
@@ -0,0 +1,96 @@
+from itertools import islice
+from django.db import transaction
+from loguru import logger
+from .models import Vouchers
+from .inventory import adjust_inventory
+from .journal import record_changes
+
+# pfSense roll exports start with a fixed comment header before the codes
+HEADER_LINES = 7
+CHUNK_SIZE = 1000
+BATCH_SIZE = 500
+
+VOUCHER_NO_MAX_LENGTH = Vouchers._meta.get_field('voucher_no').max_length
+
+
+def parse_voucher_line(line):
+    """
+    Returns the voucher code on a roll line, '' for blank/comment lines
+    and None when the line is malformed
+    """
+    code = line.strip()
+    if not code or code.startswith('#'):
+        return ''
+
+    code = code.strip('"\'').strip()
+    if not code or len(code) > VOUCHER_NO_MAX_LENGTH or any(c.isspace() or c == ',' for c in code):
+        return None
+    return code
+
+
+def import_voucher_file(voucher_file, user, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, progress=None):
+    """
+    Streams a pfSense roll file into Vouchers.
+
+    Each chunk of lines is deduplicated against existing voucher numbers with a
+    single query and inserted with bulk_create, together with the matching
+    'unused' inventory increment and change journal entries. Returns the per-file counts:
+    {'rows': n, 'inserted': n, 'duplicates': n, 'malformed': n}
+    """
+    counts = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'malformed': 0}
+
+    with open(voucher_file.file.path, 'r') as f:
+        for _ in islice(f, HEADER_LINES):
+            pass
+
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                break
+
+            codes = []
+            seen = set()
+            for line in lines:
+                code = parse_voucher_line(line)
+                if code is None:
+                    counts['malformed'] += 1
+                elif code in seen:
+                    counts['duplicates'] += 1
+                elif code:
+                    seen.add(code)
+                    codes.append(code)
+
+            existing = set(
+                Vouchers.objects.filter(voucher_no__in=codes).values_list('voucher_no', flat=True)
+            )
+            new_vouchers = [
+                Vouchers(
+                    user=user,
+                    voucher_no=code,
+                    file=voucher_file,
+                    validity_duration=24,
+                )
+                for code in codes if code not in existing
+            ]
+
+            inserted = 0
+            with transaction.atomic():
+                Vouchers.objects.bulk_create(new_vouchers, batch_size=batch_size, ignore_conflicts=True)
+                if new_vouchers:
+                    # ignore_conflicts hides rows lost to a concurrent import, so read back what landed
+                    inserted_ids = list(Vouchers.objects.filter(
+                        file=voucher_file, voucher_no__in=[voucher.voucher_no for voucher in new_vouchers]
+                    ).values_list('id', flat=True))
+                    inserted = len(inserted_ids)
+                    adjust_inventory({(voucher_file.category_id, 'unused'): inserted})
+                    record_changes(inserted_ids)
+
+            counts['rows'] += len(lines)
+            counts['duplicates'] += len(existing) + len(new_vouchers) - inserted
+            counts['inserted'] += inserted
+
+            if progress:
+                progress(counts)
+
+    logger.info(f"Imported {voucher_file.name}: {counts}")
+    return counts
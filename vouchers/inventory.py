@@ -0,0 +1,96 @@
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from management.cache import invalidate
+from .models import Vouchers, VoucherInventory
+from .caching import category_list
+
+
+def status_counts(queryset):
+    """{(category_id, status): n} for a Vouchers queryset, in one grouped query"""
+    rows = queryset.order_by().values('file__category_id', 'status').annotate(n=Count('id'))
+    return {(row['file__category_id'], row['status']): row['n'] for row in rows}
+
+
+def adjust_inventory(deltas):
+    """
+    Applies {(category_id, status): delta} to the counters.
+
+    Each counter is bumped with an F() update, so concurrent writers don't lose
+    increments. Call it inside the transaction that changes the vouchers so
+    the counters commit or roll back with them.
+    """
+    for (category_id, status), delta in deltas.items():
+        if not delta:
+            continue
+        counter = VoucherInventory.objects.filter(category_id=category_id, status=status)
+        if counter.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                VoucherInventory.objects.create(category_id=category_id, status=status, count=delta)
+        except IntegrityError:
+            # another transaction created the row first
+            counter.update(count=F('count') + delta)
+    if any(deltas.values()):
+        invalidate('dashboard', 'inventory')
+
+
+def move_inventory(counts, new_status):
+    """
+    Moves vouchers counted by status_counts() to new_status.
+    `counts` must be taken from the rows before their status was changed.
+    """
+    deltas = defaultdict(int)
+    for (category_id, status), n in counts.items():
+        if status != new_status:
+            deltas[(category_id, status)] -= n
+            deltas[(category_id, new_status)] += n
+    adjust_inventory(deltas)
+
+
+@transaction.atomic
+def rebuild_inventory():
+    """
+    Recounts every counter from Vouchers.
+    Returns the counters that had drifted: {(category_id, status): (stored, actual)}
+    """
+    stored = {
+        (category_id, status): count
+        for category_id, status, count in VoucherInventory.objects.values_list('category_id', 'status', 'count')
+    }
+    actual = status_counts(Vouchers.objects.all())
+
+    VoucherInventory.objects.all().delete()
+    VoucherInventory.objects.bulk_create([
+        VoucherInventory(category_id=category_id, status=status, count=n)
+        for (category_id, status), n in actual.items()
+    ])
+    invalidate('dashboard', 'inventory')
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in stored.keys() | actual.keys()
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+
+
+def inventory_summary():
+    """
+    Per-category counts for the dashboard and the inventory API:
+    [{'category': id, 'name': ..., 'counts': {status: n}, 'total': n}]
+    """
+    summary = {
+        category['id']: {'category': category['id'], 'name': category['name'], 'counts': {}, 'total': 0}
+        for category in category_list()
+    }
+    for category_id, status, count in VoucherInventory.objects.values_list('category_id', 'status', 'count'):
+        entry = summary.get(category_id)
+        if entry is None:
+            continue
+        entry['counts'][status] = count
+        entry['total'] += count
+
+    statuses = [status for status, _ in Vouchers.STATUS_CHOICES]
+    for entry in summary.values():
+        entry['counts'] = {status: entry['counts'].get(status, 0) for status in statuses}
+    return list(summary.values())
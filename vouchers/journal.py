@@ -0,0 +1,52 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .models import VoucherChange
+
+JOURNAL_BATCH_SIZE = 1000
+# a missing change id younger than this may belong to a transaction that has
+# not committed yet; older gaps are rollbacks or deleted vouchers
+JOURNAL_GAP_SECONDS = getattr(settings, 'VOUCHER_JOURNAL_GAP_SECONDS', 300)
+
+
+def record_changes(voucher_ids):
+    """
+    Appends a journal entry for each voucher. Call it in the transaction that
+    changes the vouchers, next to the UPDATE that also clears their
+    synced_to_pfsense flag.
+    """
+    VoucherChange.objects.bulk_create(
+        [VoucherChange(voucher_id=voucher_id) for voucher_id in voucher_ids],
+        batch_size=JOURNAL_BATCH_SIZE,
+    )
+
+
+def journal_head():
+    """Id of the latest change, 0 for an empty journal"""
+    return VoucherChange.objects.aggregate(head=Max('id'))['head'] or 0
+
+
+def changes_after(cursor, limit, now=None):
+    """
+    Up to `limit` (change id, voucher id) pairs after the cursor, in journal
+    order, ending before the first gap in the ids that is not settled yet.
+
+    Ids are handed out when a change is inserted, not when it commits: on
+    Postgres a long import can hold lower ids while a short write with higher
+    ids is already visible. A reader that jumped over the gap would move its
+    cursor past changes it never saw, so it waits until the change after the
+    gap is older than JOURNAL_GAP_SECONDS.
+    """
+    settled = (now or timezone.now()) - timedelta(seconds=JOURNAL_GAP_SECONDS)
+    changes = []
+    expected = cursor + 1
+    for change_id, voucher_id, changed_at in (
+        VoucherChange.objects.filter(id__gt=cursor).order_by('id')
+        .values_list('id', 'voucher_id', 'changed_at')[:limit]
+    ):
+        if change_id != expected and changed_at > settled:
+            break
+        changes.append((change_id, voucher_id))
+        expected = change_id + 1
+    return changes
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from vouchers.archive import archive_logs, LOG_RETENTION_DAYS
+
+class Command(BaseCommand):
+    help = 'Move voucher logs older than the retention window to gzipped JSONL archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=LOG_RETENTION_DAYS, help='Days of logs kept in the table')
+
+    def handle(self, *args, **options):
+        archived = archive_logs(retention_days=options['days'])
+        for month, count in archived:
+            self.stdout.write(f"{month:%Y-%m}: {count} entries archived")
+        self.stdout.write(self.style.SUCCESS(f"Archived {sum(count for _, count in archived)} voucher logs"))
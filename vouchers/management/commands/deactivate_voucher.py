@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from vouchers.expiry import expire_vouchers
+
+class Command(BaseCommand):
+    help = 'Deactivate expired vouchers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        kwargs = {'batch_size': options['batch_size']} if options['batch_size'] else {}
+        metrics = expire_vouchers(**kwargs)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully deactivated {metrics['expired']} expired vouchers "
+                f"(lag {metrics['lag_seconds']:.0f}s, {metrics['duration_seconds']}s)"
+            )
+        )
@@ -0,0 +1,40 @@
+import gzip
+import sys
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from vouchers.usage import ingest_lines
+
+class Command(BaseCommand):
+    help = 'Mark vouchers used from a pfSense captive portal log (logportalauth lines)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Portal log file, .gz allowed, '-' for stdin")
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Lines ingested per round')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            if path == '-':
+                log = sys.stdin
+            elif path.endswith('.gz'):
+                log = gzip.open(path, 'rt', errors='replace')
+            else:
+                log = open(path, errors='replace')
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+        totals = {}
+        with log:
+            while True:
+                lines = list(islice(log, options['chunk_size']))
+                if not lines:
+                    break
+                for key, value in ingest_lines(lines).items():
+                    totals[key] = totals.get(key, 0) + value
+
+        self.stdout.write(
+            f"{totals.get('records', 0)} logins read ({totals.get('ignored', 0)} other lines ignored): "
+            f"{totals.get('used', 0)} vouchers marked used, {totals.get('updated', 0)} updated, "
+            f"{totals.get('duplicates', 0)} duplicates, {totals.get('unknown', 0)} unknown, "
+            f"{totals.get('expired', 0)} expired"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from vouchers.inventory import rebuild_inventory
+
+class Command(BaseCommand):
+    help = 'Rebuild the voucher inventory counters from the vouchers table'
+
+    def handle(self, *args, **options):
+        drift = rebuild_inventory()
+        for (category_id, status), (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f"category {category_id} {status}: {stored} -> {actual}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt voucher inventory, {len(drift)} counters corrected"))
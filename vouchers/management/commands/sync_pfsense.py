@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from vouchers.models import PfSenseConfig
+from vouchers.pfsense import sync_all_gateways, SYNC_BATCH_SIZE, SYNC_WORKERS
+
+class Command(BaseCommand):
+    help = 'Push pending vouchers to the active pfSense gateways'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', type=int, action='append', help='PfSenseConfig id, repeatable (default: all active)')
+        parser.add_argument('--force', action='store_true', help='Ignore the failure backoff')
+        parser.add_argument('--batch-size', type=int, default=SYNC_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=SYNC_WORKERS, help='Parallel requests per gateway')
+
+    def handle(self, *args, **options):
+        configs = None
+        if options['config']:
+            configs = PfSenseConfig.objects.filter(id__in=options['config'])
+            if not configs.exists():
+                raise CommandError('No such pfSense configuration')
+
+        results = sync_all_gateways(
+            configs,
+            force=options['force'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+        )
+        for config_id, metrics in results.items():
+            name = f"{metrics['gateway']} (#{config_id})"
+            if metrics.get('skipped'):
+                self.stdout.write(f"{name}: skipped (backing off or already syncing)")
+                continue
+            for error in metrics['errors']:
+                self.stderr.write(f"{name}: {error}")
+            self.stdout.write(
+                f"{name}: {metrics['synced']} vouchers in {metrics['duration_seconds']}s "
+                f"({metrics['throughput']}/s, {metrics['failed']} failed)"
+            )
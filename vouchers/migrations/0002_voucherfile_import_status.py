@@ -0,0 +1,51 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='vouchers',
+            name='voucher_password',
+        ),
+        migrations.RemoveField(
+            model_name='vouchers',
+            name='voucher_username',
+        ),
+        migrations.AddField(
+            model_name='voucherfile',
+            name='duplicate_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='voucherfile',
+            name='import_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='voucherfile',
+            name='imported_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='voucherfile',
+            name='malformed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='voucherfile',
+            name='row_count',
+            field=models.IntegerField(default=0, help_text='Roll lines processed by the import'),
+        ),
+        migrations.AlterField(
+            model_name='voucherfile',
+            name='status',
+            field=models.CharField(choices=[('not populated', 'Not populated'), ('queued', 'Queued'), ('importing', 'Importing'), ('populated', 'Populated'), ('failed', 'Failed')], default='not populated', max_length=50),
+        ),
+    ]
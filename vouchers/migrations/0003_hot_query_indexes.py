@@ -0,0 +1,41 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0002_voucherfile_import_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='voucherlogs',
+            index=models.Index(fields=['action_type', '-date_created', '-id'], name='voucherlogs_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voucherlogs',
+            index=models.Index(fields=['-date_created', '-id'], name='voucherlogs_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vouchers',
+            index=models.Index(fields=['status', 'file'], name='vouchers_status_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vouchers',
+            index=models.Index(fields=['status', '-date_created', '-id'], name='vouchers_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vouchers',
+            index=models.Index(fields=['active', 'expiry_time'], name='vouchers_active_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vouchers',
+            index=models.Index(condition=models.Q(('status', 'unused')), fields=['file', 'id'], name='vouchers_unused_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vouchers',
+            index=models.Index(condition=models.Q(('active', True), ('expiry_time__isnull', False)), fields=['expiry_time'], name='vouchers_expiring_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vouchers', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='voucherlogs',
+            name='user',
+            field=models.ForeignKey(blank=True, help_text='Empty for system actions', null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
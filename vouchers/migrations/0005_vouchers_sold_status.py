@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0004_system_voucher_logs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vouchers',
+            name='status',
+            field=models.CharField(choices=[('unused', 'Unused'), ('used', 'Used'), ('expired', 'Expired'), ('printed', 'Printed'), ('sold', 'Sold')], default='unused', max_length=50),
+        ),
+    ]
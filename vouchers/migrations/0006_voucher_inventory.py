@@ -0,0 +1,44 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_vouchers(apps, schema_editor):
+    Vouchers = apps.get_model('vouchers', 'Vouchers')
+    VoucherInventory = apps.get_model('vouchers', 'VoucherInventory')
+    rows = Vouchers.objects.order_by().values('file__category_id', 'status').annotate(n=models.Count('id'))
+    VoucherInventory.objects.bulk_create([
+        VoucherInventory(category_id=row['file__category_id'], status=row['status'], count=row['n'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0005_vouchers_sold_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoucherInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('unused', 'Unused'), ('used', 'Used'), ('expired', 'Expired'), ('printed', 'Printed'), ('sold', 'Sold')], max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='vouchers.vouchercategory')),
+            ],
+            options={
+                'verbose_name': 'VoucherInventory',
+                'verbose_name_plural': 'VoucherInventory',
+                'ordering': ['category', 'status'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='voucherinventory',
+            constraint=models.UniqueConstraint(fields=('category', 'status'), name='voucherinventory_category_status_uniq'),
+        ),
+        migrations.RunPython(count_vouchers, migrations.RunPython.noop),
+    ]
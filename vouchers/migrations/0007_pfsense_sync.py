@@ -0,0 +1,22 @@
+# Generated by Django 4.2.2 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0006_voucher_inventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='api_path',
+            field=models.CharField(default='/api/v1/services/captive_portal/vouchers', help_text='Path of the pfSense API endpoint that accepts voucher batches', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='vouchers',
+            index=models.Index(condition=models.Q(('synced_to_pfsense', False)), fields=['id'], name='vouchers_unsynced_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0007_pfsense_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='consecutive_failures',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='last_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='last_sync_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='last_sync_duration',
+            field=models.FloatField(default=0, help_text='Seconds'),
+        ),
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='Backoff: no sync before this time', null=True),
+        ),
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='sync_cursor',
+            field=models.BigIntegerField(default=0, help_text='Highest voucher id pushed to this gateway'),
+        ),
+        migrations.AddField(
+            model_name='pfsenseconfig',
+            name='sync_lease_until',
+            field=models.DateTimeField(blank=True, help_text='Set while a sync to this gateway runs', null=True),
+        ),
+    ]
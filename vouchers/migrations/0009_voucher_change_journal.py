@@ -0,0 +1,65 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_journal(apps, schema_editor):
+    """
+    One change per existing voucher in id order, so a gateway that starts from
+    0 receives every voucher, and the voucher-id cursors of the gateways become
+    the matching journal positions.
+    """
+    Vouchers = apps.get_model('vouchers', 'Vouchers')
+    VoucherChange = apps.get_model('vouchers', 'VoucherChange')
+    PfSenseConfig = apps.get_model('vouchers', 'PfSenseConfig')
+
+    last_id = 0
+    while True:
+        ids = list(Vouchers.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:1000])
+        if not ids:
+            break
+        VoucherChange.objects.bulk_create([VoucherChange(voucher_id=voucher_id) for voucher_id in ids])
+        last_id = ids[-1]
+
+    for config in PfSenseConfig.objects.filter(sync_cursor__gt=0):
+        position = VoucherChange.objects.filter(voucher_id__lte=config.sync_cursor).aggregate(
+            position=models.Max('id')
+        )['position']
+        PfSenseConfig.objects.filter(id=config.id).update(sync_cursor=position or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0008_pfsense_gateway_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoucherChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'VoucherChange',
+                'verbose_name_plural': 'VoucherChanges',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='vouchers',
+            name='vouchers_unsynced_idx',
+        ),
+        migrations.AlterField(
+            model_name='pfsenseconfig',
+            name='sync_cursor',
+            field=models.BigIntegerField(default=0, help_text='Last VoucherChange id pushed to this gateway'),
+        ),
+        migrations.AddField(
+            model_name='voucherchange',
+            name='voucher',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='vouchers.vouchers'),
+        ),
+        migrations.RunPython(seed_journal, migrations.RunPython.noop),
+    ]
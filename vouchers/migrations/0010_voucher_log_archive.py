@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0009_voucher_change_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoucherLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month the entries belong to')),
+                ('file', models.FileField(max_length=255, upload_to='log_archive')),
+                ('row_count', models.IntegerField(default=0)),
+                ('start', models.DateTimeField(help_text='Oldest entry')),
+                ('end', models.DateTimeField(help_text='Newest entry')),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'VoucherLogArchive',
+                'verbose_name_plural': 'VoucherLogArchives',
+                'ordering': ['-month', '-first_id'],
+                'indexes': [models.Index(fields=['start', 'end'], name='voucherlogarchive_range_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,93 @@
+from django.db import migrations
+
+FTS_TABLE = 'vouchers_voucherlogs_fts'
+
+# SQLite: an FTS5 trigram table over action + username, keyed by the log id
+# and kept in step by triggers, so substring searches use the index
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(action, username, tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS vouchers_voucherlogs_fts_insert AFTER INSERT ON vouchers_voucherlogs BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, action, username)
+        VALUES (new.id, new.action, (SELECT username FROM {{users}} WHERE id = new.user_id));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS vouchers_voucherlogs_fts_update AFTER UPDATE OF action, user_id ON vouchers_voucherlogs BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, action, username)
+        VALUES (new.id, new.action, (SELECT username FROM {{users}} WHERE id = new.user_id));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS vouchers_voucherlogs_fts_delete AFTER DELETE ON vouchers_voucherlogs BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS vouchers_voucherlogs_fts_username AFTER UPDATE OF username ON {{users}} BEGIN
+        UPDATE {FTS_TABLE} SET username = new.username
+        WHERE rowid IN (SELECT id FROM vouchers_voucherlogs WHERE user_id = new.id);
+    END""",
+    f"""INSERT INTO {FTS_TABLE}(rowid, action, username)
+        SELECT logs.id, logs.action, users.username
+        FROM vouchers_voucherlogs logs LEFT JOIN {{users}} users ON users.id = logs.user_id""",
+]
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS vouchers_voucherlogs_fts_insert",
+    "DROP TRIGGER IF EXISTS vouchers_voucherlogs_fts_update",
+    "DROP TRIGGER IF EXISTS vouchers_voucherlogs_fts_delete",
+    "DROP TRIGGER IF EXISTS vouchers_voucherlogs_fts_username",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# Postgres: trigram GIN indexes on the expressions icontains compares, so the
+# existing UPPER(...) LIKE UPPER('%q%') filters use them as they are
+POSTGRES_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS voucherlogs_action_trgm_idx ON vouchers_voucherlogs USING gin (UPPER(action) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS users_username_trgm_idx ON {users} USING gin (UPPER(username) gin_trgm_ops)",
+]
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS voucherlogs_action_trgm_idx",
+    "DROP INDEX IF EXISTS users_username_trgm_idx",
+]
+
+
+def _run(apps, schema_editor, statements):
+    users = schema_editor.quote_name(apps.get_model('users', 'User')._meta.db_table)
+    for statement in statements:
+        schema_editor.execute(statement.format(users=users))
+
+
+def sqlite_has_trigram(schema_editor):
+    # the trigram tokenizer needs SQLite 3.34
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.trigram_check USING fts5(a, tokenize='trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp.trigram_check")
+    return True
+
+
+def install_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and sqlite_has_trigram(schema_editor):
+        _run(apps, schema_editor, SQLITE_INSTALL)
+    elif vendor == 'postgresql':
+        _run(apps, schema_editor, POSTGRES_INSTALL)
+    # elsewhere vouchers.search falls back to icontains
+
+
+def uninstall_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(apps, schema_editor, SQLITE_UNINSTALL)
+    elif vendor == 'postgresql':
+        _run(apps, schema_editor, POSTGRES_UNINSTALL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_image'),
+        ('vouchers', '0010_voucher_log_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'vouchers_voucherlogs_fts'
+FTS_TRIGGERS = ('insert', 'update', 'delete', 'username')
+
+
+def backfill_categories(apps, schema_editor):
+    # older entries about a voucher get its category, for per-category reports
+    VoucherLogs = apps.get_model('vouchers', 'VoucherLogs')
+    Vouchers = apps.get_model('vouchers', 'Vouchers')
+    VoucherLogs.objects.filter(voucher__isnull=False, category__isnull=True).update(
+        category=models.Subquery(Vouchers.objects.filter(id=models.OuterRef('voucher_id')).values('file__category_id')[:1])
+    )
+
+
+def _has_fts(schema_editor):
+    connection = schema_editor.connection
+    return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+
+def _drop_fts_triggers(schema_editor):
+    for trigger in FTS_TRIGGERS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS vouchers_voucherlogs_fts_{trigger}")
+
+
+def _build_fts(apps, schema_editor, columns, username):
+    """
+    (Re)creates the SQLite search table of 0011 over `columns` of the log,
+    plus the username as 0011 had it
+    """
+    users = schema_editor.quote_name(apps.get_model('users', 'User')._meta.db_table)
+    indexed = columns + ['username'] if username else columns
+    values = ', '.join(f'new.{column}' for column in columns)
+    if username:
+        values += f", (SELECT username FROM {users} WHERE id = new.user_id)"
+    row = f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(indexed)}) VALUES (new.id, {values});"
+
+    _drop_fts_triggers(schema_editor)
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(indexed)}, tokenize='trigram')")
+    schema_editor.execute(f"""CREATE TRIGGER vouchers_voucherlogs_fts_insert AFTER INSERT ON vouchers_voucherlogs BEGIN
+        {row}
+    END""")
+    schema_editor.execute(f"""CREATE TRIGGER vouchers_voucherlogs_fts_update AFTER UPDATE OF {', '.join(columns)}, user_id ON vouchers_voucherlogs BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        {row}
+    END""")
+    schema_editor.execute(f"""CREATE TRIGGER vouchers_voucherlogs_fts_delete AFTER DELETE ON vouchers_voucherlogs BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""")
+    if username:
+        schema_editor.execute(f"""CREATE TRIGGER vouchers_voucherlogs_fts_username AFTER UPDATE OF username ON {users} BEGIN
+            UPDATE {FTS_TABLE} SET username = new.username
+            WHERE rowid IN (SELECT id FROM vouchers_voucherlogs WHERE user_id = new.id);
+        END""")
+        selected = ', '.join(f'logs.{column}' for column in columns) + ', users.username'
+        source = f"vouchers_voucherlogs logs LEFT JOIN {users} users ON users.id = logs.user_id"
+    else:
+        selected = ', '.join(f'logs.{column}' for column in columns)
+        source = "vouchers_voucherlogs logs"
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(indexed)}) SELECT logs.id, {selected} FROM {source}")
+
+
+def index_target(apps, schema_editor):
+    # new entries keep the voucher number / file / gateway in target. Usernames
+    # leave the index, vouchers.search matches them on the small users table:
+    # a trigger on users naming this table would break SQLite table rebuilds.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS voucherlogs_target_trgm_idx ON vouchers_voucherlogs USING gin (UPPER(target) gin_trgm_ops)"
+        )
+    if _has_fts(schema_editor):
+        _build_fts(apps, schema_editor, ['action', 'target'], username=False)
+
+
+def unindex_target(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS voucherlogs_target_trgm_idx")
+    if _has_fts(schema_editor):
+        # rebuilt as in 0011 once the columns are gone (restore_username_index)
+        _drop_fts_triggers(schema_editor)
+
+
+def restore_username_index(apps, schema_editor):
+    if _has_fts(schema_editor):
+        _build_fts(apps, schema_editor, ['action'], username=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_image'),
+        ('vouchers', '0011_voucher_log_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_username_index),
+        migrations.AddField(
+            model_name='voucherlogs',
+            name='category',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logs', to='vouchers.vouchercategory'),
+        ),
+        migrations.AddField(
+            model_name='voucherlogs',
+            name='count',
+            field=models.IntegerField(blank=True, help_text='Vouchers affected by bulk actions', null=True),
+        ),
+        migrations.AddField(
+            model_name='voucherlogs',
+            name='event',
+            field=models.CharField(blank=True, choices=[('file_created', 'File created'), ('category_created', 'Category created'), ('voucher_assigned', 'Voucher assigned'), ('voucher_printed', 'Voucher printed'), ('voucher_used', 'Voucher used'), ('file_populated', 'File populated'), ('gateway_synced', 'Gateway synced'), ('voucher_expired', 'Voucher expired'), ('portal_login', 'Portal login')], max_length=30, null=True),
+        ),
+        migrations.AddField(
+            model_name='voucherlogs',
+            name='target',
+            field=models.CharField(blank=True, help_text='Voucher number, file, category or gateway acted on', max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='voucherlogs',
+            name='action',
+            field=models.CharField(blank=True, help_text='Whole message of entries without an event, otherwise its detail', max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='voucherlogs',
+            index=models.Index(fields=['category', 'action_type', 'date_created'], name='voucherlogs_category_type_idx'),
+        ),
+        migrations.RunPython(backfill_categories, migrations.RunPython.noop),
+        migrations.RunPython(index_target, unindex_target),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.2 on 2026-10-18 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vouchers', '0012_structured_voucher_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpirySweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('swept_at', models.DateTimeField()),
+                ('expired', models.IntegerField(default=0)),
+                ('batches', models.IntegerField(default=0)),
+                ('pending_before', models.IntegerField(default=0, help_text='Backlog when the sweep started')),
+                ('lag_seconds', models.FloatField(default=0, help_text='Age of the oldest pending expiry when the sweep started')),
+                ('duration_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'ExpirySweep',
+                'verbose_name_plural': 'ExpirySweeps',
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 
@@ -17,12 +18,26 @@ class VoucherCategory(models.Model):
 
 
 class VoucherFile(models.Model):
+    STATUS_CHOICES = [
+        ('not populated', 'Not populated'),
+        ('queued', 'Queued'),
+        ('importing', 'Importing'),
+        ('populated', 'Populated'),
+        ('failed', 'Failed'),
+    ]
+
     user = models.ForeignKey("users.User", on_delete=models.CASCADE)
     name = models.CharField(max_length=50)
     file = models.FileField(upload_to='vouchers', max_length=100)
     category = models.ForeignKey("vouchers.VoucherCategory", on_delete=models.CASCADE)
     date_created = models.DateField(auto_now_add=True)
-    status = models.CharField(max_length=50, default='not populated')
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='not populated')
+
+    row_count = models.IntegerField(default=0, help_text="Roll lines processed by the import")
+    imported_count = models.IntegerField(default=0)
+    duplicate_count = models.IntegerField(default=0)
+    malformed_count = models.IntegerField(default=0)
+    import_error = models.TextField(blank=True, null=True)
 
     class Meta:
         ordering = ['-date_created']
@@ -42,6 +57,7 @@ class Vouchers(models.Model):
         ('used', 'Used'),
         ('expired', 'Expired'),
         ('printed', 'Printed'),
+        ('sold', 'Sold'),
     ]
     
     voucher_no = models.CharField(max_length=100, unique=True)
@@ -64,6 +80,20 @@ class Vouchers(models.Model):
         ordering = ['-date_created']
         verbose_name = _("Voucher")
         verbose_name_plural = _("Vouchers")
+        indexes = [
+            # status + category listings (category is reached through file)
+            models.Index(fields=['status', 'file'], name='vouchers_status_file_idx'),
+            # keyset pages of the voucher list, filtered by status
+            models.Index(fields=['status', '-date_created', '-id'], name='vouchers_status_created_idx'),
+            models.Index(fields=['active', 'expiry_time'], name='vouchers_active_expiry_idx'),
+            # partial indexes, ignored by backends without support for them
+            models.Index(fields=['file', 'id'], condition=Q(status='unused'), name='vouchers_unused_idx'),
+            models.Index(
+                fields=['expiry_time'],
+                condition=Q(active=True, expiry_time__isnull=False),
+                name='vouchers_expiring_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.voucher_no} - {self.status}"
@@ -72,6 +102,65 @@ class Vouchers(models.Model):
         return reverse("Vouchers_detail", kwargs={"pk": self.pk})
 
 
+class VoucherChange(models.Model):
+    """
+    Append-only journal of voucher changes (creation, status, active, expiry),
+    consumed in id order by the pfSense sync (see vouchers.journal)
+    """
+    id = models.BigAutoField(primary_key=True)
+    voucher = models.ForeignKey("vouchers.Vouchers", on_delete=models.CASCADE, related_name='changes')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("VoucherChange")
+        verbose_name_plural = _("VoucherChanges")
+
+    def __str__(self):
+        return f"{self.voucher_id} changed at {self.changed_at}"
+
+
+class VoucherInventory(models.Model):
+    """
+    Voucher count per category and status, kept in step with Vouchers by the
+    code paths that change status (see vouchers.inventory)
+    """
+    category = models.ForeignKey("vouchers.VoucherCategory", on_delete=models.CASCADE, related_name='inventory')
+    status = models.CharField(max_length=50, choices=Vouchers.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['category', 'status']
+        verbose_name = _("VoucherInventory")
+        verbose_name_plural = _("VoucherInventory")
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'status'], name='voucherinventory_category_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} - {self.status}: {self.count}"
+
+
+def render_log_message(event, action, username=None, target=None, count=None, category=None):
+    """
+    Display text of a log entry from its structured fields; entries without
+    an event (older ones) carry their whole text in `action`
+    """
+    template = VoucherLogs.EVENT_MESSAGES.get(event)
+    if template is None:
+        return action
+    message = template.format(
+        user=username or 'system',
+        target=target or '',
+        count=count or 0,
+        category=category or '-',
+        detail=action,
+    )
+    if action and '{detail}' not in template:
+        message += f", {action}"
+    return message
+
+
 class VoucherLogs(models.Model):
     ACTION_CHOICES = [
         ('create', 'Created'),
@@ -81,11 +170,31 @@ class VoucherLogs(models.Model):
         ('sync', 'Synced to pfSense'),
         ('expire', 'Expired'),
     ]
+    # event: display template, `action` being the free-text detail
+    EVENT_MESSAGES = {
+        'file_created': "{user} created file {target}",
+        'category_created': "{user} created category {target}",
+        'voucher_assigned': "{user} assigned voucher {target} to {detail}",
+        'voucher_printed': "{user} marked voucher {target} as printed ({category})",
+        'voucher_used': "{user} marked voucher {target} as used ({category})",
+        'file_populated': "{user} populated {count} vouchers from {target}",
+        'gateway_synced': "Synced {count} vouchers to {target}",
+        'voucher_expired': "Voucher {target} expired",
+        'portal_login': "Voucher {target} used by {detail}",
+    }
+    EVENT_CHOICES = [(event, event.replace('_', ' ').capitalize()) for event in EVENT_MESSAGES]
     
-    user = models.ForeignKey("users.User", on_delete=models.CASCADE)
-    action = models.CharField(max_length=200)
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, null=True, blank=True, help_text="Empty for system actions")
+    action = models.CharField(max_length=200, blank=True, help_text="Whole message of entries without an event, otherwise its detail")
     action_type = models.CharField(max_length=20, choices=ACTION_CHOICES, default='create')
+    event = models.CharField(max_length=30, choices=EVENT_CHOICES, null=True, blank=True)
     voucher = models.ForeignKey("vouchers.Vouchers", on_delete=models.SET_NULL, null=True, blank=True)
+    category = models.ForeignKey(
+        "vouchers.VoucherCategory", on_delete=models.SET_NULL, null=True, blank=True, related_name='logs',
+        db_index=False,  # leads voucherlogs_category_type_idx
+    )
+    count = models.IntegerField(null=True, blank=True, help_text="Vouchers affected by bulk actions")
+    target = models.CharField(max_length=200, null=True, blank=True, help_text="Voucher number, file, category or gateway acted on")
     date_created = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
 
@@ -93,14 +202,58 @@ class VoucherLogs(models.Model):
         ordering = ['-date_created']
         verbose_name = _("VoucherLog")
         verbose_name_plural = _("VoucherLogs")
+        indexes = [
+            models.Index(fields=['action_type', '-date_created', '-id'], name='voucherlogs_type_created_idx'),
+            models.Index(fields=['-date_created', '-id'], name='voucherlogs_created_idx'),
+            # audit summaries grouped by category and action over a period
+            models.Index(fields=['category', 'action_type', 'date_created'], name='voucherlogs_category_type_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.user} : {self.action}'
+        return f'{self.user} : {self.message}'
+
+    @property
+    def message(self):
+        """Rendered text, select user and category with the entries to list"""
+        return render_log_message(
+            self.event,
+            self.action,
+            username=self.user.username if self.user_id else None,
+            target=self.target,
+            count=self.count,
+            category=self.category.name if self.category_id else None,
+        )
 
     def get_absolute_url(self):
         return reverse("VoucherLogs_detail", kwargs={"pk": self.pk})
 
 
+class VoucherLogArchive(models.Model):
+    """
+    Gzipped JSONL file of VoucherLogs moved out of the table, one or more per
+    month (see vouchers.archive)
+    """
+    month = models.DateField(help_text="First day of the month the entries belong to")
+    file = models.FileField(upload_to='log_archive', max_length=255)
+    row_count = models.IntegerField(default=0)
+    start = models.DateTimeField(help_text="Oldest entry")
+    end = models.DateTimeField(help_text="Newest entry")
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-month', '-first_id']
+        verbose_name = _("VoucherLogArchive")
+        verbose_name_plural = _("VoucherLogArchives")
+        indexes = [
+            models.Index(fields=['start', 'end'], name='voucherlogarchive_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.row_count} entries"
+
+
 class VoucherUser(models.Model):
     voucher = models.OneToOneField("vouchers.Vouchers", on_delete=models.CASCADE, related_name='voucher_user')
     voucher_no = models.CharField(max_length=100)
@@ -132,12 +285,50 @@ class PfSenseConfig(models.Model):
     use_ssl = models.BooleanField(default=True)
     verify_ssl = models.BooleanField(default=False)
     captive_portal_zone = models.CharField(max_length=100, default="zone1", help_text="Captive portal zone name")
+    api_path = models.CharField(
+        max_length=255,
+        default="/api/v1/services/captive_portal/vouchers",
+        help_text="Path of the pfSense API endpoint that accepts voucher batches"
+    )
     is_active = models.BooleanField(default=True)
     last_sync = models.DateTimeField(null=True, blank=True)
+
+    # sync state, one per gateway (see vouchers.pfsense)
+    sync_cursor = models.BigIntegerField(default=0, help_text="Last VoucherChange id pushed to this gateway")
+    sync_lease_until = models.DateTimeField(null=True, blank=True, help_text="Set while a sync to this gateway runs")
+    consecutive_failures = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="Backoff: no sync before this time")
+    last_error = models.TextField(blank=True, null=True)
+    last_sync_count = models.IntegerField(default=0)
+    last_sync_duration = models.FloatField(default=0, help_text="Seconds")
     
     class Meta:
         verbose_name = _("PfSense Configuration")
         verbose_name_plural = _("PfSense Configurations")
 
     def __str__(self):
-        return f"{self.name} ({self.host})"
\ No newline at end of file
+        return f"{self.name} ({self.host})"
+
+    @property
+    def base_url(self):
+        scheme = 'https' if self.use_ssl else 'http'
+        return f"{scheme}://{self.host}:{self.port}"
+
+class ExpirySweep(models.Model):
+    """
+    Result of the last expiry sweep, one row updated by every sweep (see
+    vouchers.expiry), so the web processes can report what the worker did
+    """
+    swept_at = models.DateTimeField()
+    expired = models.IntegerField(default=0)
+    batches = models.IntegerField(default=0)
+    pending_before = models.IntegerField(default=0, help_text="Backlog when the sweep started")
+    lag_seconds = models.FloatField(default=0, help_text="Age of the oldest pending expiry when the sweep started")
+    duration_seconds = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = _("ExpirySweep")
+        verbose_name_plural = _("ExpirySweeps")
+
+    def __str__(self):
+        return f"Expiry sweep at {self.swept_at}: {self.expired} expired"
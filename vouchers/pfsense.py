@@ -0,0 +1,324 @@
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.db import connection
+from django.db.models import Min, Q
+from django.utils import timezone
+from loguru import logger
+from .models import Vouchers, VoucherChange, PfSenseConfig
+from .journal import changes_after
+from . import audit
+
+SYNC_BATCH_SIZE = getattr(settings, 'PFSENSE_SYNC_BATCH_SIZE', 200)
+SYNC_WORKERS = getattr(settings, 'PFSENSE_SYNC_WORKERS', 4)
+SYNC_TIMEOUT = getattr(settings, 'PFSENSE_SYNC_TIMEOUT', 10)
+SYNC_RETRIES = getattr(settings, 'PFSENSE_SYNC_RETRIES', 3)
+SYNC_MAX_GATEWAYS = getattr(settings, 'PFSENSE_SYNC_MAX_GATEWAYS', 8)
+# a failing gateway waits base * 2^(failures - 1) seconds, up to max
+SYNC_BACKOFF_BASE = getattr(settings, 'PFSENSE_SYNC_BACKOFF_BASE', 60)
+SYNC_BACKOFF_MAX = getattr(settings, 'PFSENSE_SYNC_BACKOFF_MAX', 3600)
+# a run holding a lease longer than this is presumed dead
+SYNC_LEASE_SECONDS = getattr(settings, 'PFSENSE_SYNC_LEASE_SECONDS', 600)
+
+class PfSenseSyncError(Exception):
+    """Raised when pfSense rejects or never answers a voucher batch"""
+
+
+class PfSenseClient:
+    """
+    HTTP client for one PfSenseConfig.
+
+    A single requests.Session with a connection pool sized for the sync
+    workers, so batches reuse keep-alive connections instead of doing a TLS
+    handshake each. Connection errors, 429 and 5xx answers are retried with
+    backoff; POST is included, the push being idempotent on the portal side
+    (a voucher already in the zone is left as is).
+    """
+
+    def __init__(self, config, pool_size=SYNC_WORKERS, retries=SYNC_RETRIES, timeout=SYNC_TIMEOUT):
+        self.config = config
+        self.timeout = timeout
+        self.url = f"{config.base_url}{config.api_path}"
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.auth = (config.username, config.password)
+        self.session.verify = config.verify_ssl
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def push_vouchers(self, vouchers):
+        """
+        Sends the current state of a batch of vouchers (dicts from
+        changed_vouchers) to the captive portal zone. The portal adds or
+        updates active/unused vouchers and drops expired ones.
+        """
+        payload = {
+            'zone': self.config.captive_portal_zone,
+            'vouchers': [
+                {
+                    'voucher': voucher['voucher_no'],
+                    'roll': voucher['pfsense_roll_id'],
+                    'status': voucher['status'],
+                    'active': voucher['active'],
+                    'expires': voucher['expiry_time'].isoformat() if voucher['expiry_time'] else None,
+                }
+                for voucher in vouchers
+            ],
+        }
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise PfSenseSyncError(f"{self.config} unreachable: {e}") from e
+        if response.status_code >= 400:
+            raise PfSenseSyncError(f"{self.config} answered {response.status_code}: {response.text[:200]}")
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pending_changes(config):
+    """Journal entries this gateway has not received yet"""
+    return VoucherChange.objects.filter(id__gt=config.sync_cursor)
+
+
+def changed_vouchers(voucher_ids):
+    """Current state of the given vouchers, as pushed to the portal"""
+    return list(
+        Vouchers.objects.filter(id__in=voucher_ids).order_by('id')
+        .values('id', 'voucher_no', 'pfsense_roll_id', 'status', 'active', 'expiry_time')
+    )
+
+
+def _batches(cursor, batch_size):
+    """
+    Walks the journal after the cursor, read on the calling thread, up to the
+    first gap that may still commit (see changes_after). Yields (last change
+    id, vouchers) with each changed voucher once per batch; vouchers deleted
+    since their change are left out.
+    """
+    now = timezone.now()
+    while True:
+        changes = changes_after(cursor, batch_size, now=now)
+        if not changes:
+            return
+        cursor = changes[-1][0]
+        yield cursor, changed_vouchers({voucher_id for _, voucher_id in changes})
+
+
+def backoff_seconds(failures):
+    return min(SYNC_BACKOFF_BASE * 2 ** (failures - 1), SYNC_BACKOFF_MAX)
+
+
+def claim_gateway(config, force=False):
+    """
+    Takes the sync lease of a gateway with a conditional update, so two runs
+    never push to the same gateway at once. Unless forced, gateways backing
+    off after failures are not claimed before next_attempt_at.
+    """
+    now = timezone.now()
+    claimable = PfSenseConfig.objects.filter(id=config.id, is_active=True).filter(
+        Q(sync_lease_until__isnull=True) | Q(sync_lease_until__lt=now)
+    )
+    if not force:
+        claimable = claimable.filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+    return claimable.update(sync_lease_until=now + timedelta(seconds=SYNC_LEASE_SECONDS)) == 1
+
+
+def sync_gateway(config, batch_size=SYNC_BATCH_SIZE, workers=SYNC_WORKERS, user=None):
+    """
+    Pushes the vouchers changed since the gateway's journal cursor to its
+    captive portal zone, so a run only touches what changed since the last
+    one. The caller must hold the gateway's lease (claim_gateway).
+
+    Journal batches are read on this thread and posted by up to `workers`
+    threads sharing the gateway's pooled session, with at most 2 * workers
+    batches in flight. The cursor only moves over the batches accepted in
+    order: after a failure no new batch is sent, and the failed batch and
+    everything after it is pushed again on the next run. A failed run backs
+    the gateway off exponentially. Releases the lease and returns the run
+    metrics.
+    """
+    started = time.monotonic()
+    metrics = {'gateway': config.name, 'synced': 0, 'failed': 0, 'batches': 0, 'errors': []}
+    cursor = config.sync_cursor
+    in_order = deque()  # [future, (last change id, vouchers), accepted] in submission order
+
+    def settle(entry):
+        future, (_, vouchers), _ = entry
+        try:
+            future.result()
+        except PfSenseSyncError as e:
+            metrics['failed'] += len(vouchers)
+            if len(metrics['errors']) < 10:
+                metrics['errors'].append(str(e))
+            return
+        entry[2] = True
+        metrics['batches'] += 1
+
+    try:
+        with PfSenseClient(config, pool_size=workers) as client, ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = {}
+            for batch in _batches(cursor, batch_size):
+                if metrics['errors']:
+                    break
+                if batch[1]:
+                    future = pool.submit(client.push_vouchers, batch[1])
+                else:
+                    # only deleted vouchers in these changes, nothing to send
+                    future = Future()
+                    future.set_result(None)
+                entry = [future, batch, False]
+                in_flight[future] = entry
+                in_order.append(entry)
+                if len(in_flight) >= workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        settle(in_flight.pop(future))
+
+            for future in list(in_flight):
+                settle(in_flight.pop(future))
+
+        while in_order and in_order[0][2]:
+            _, (cursor, vouchers), _ = in_order.popleft()
+            metrics['synced'] += len(vouchers)
+    except Exception as e:
+        # anything unexpected (DB, bad config) counts as a failed run for this gateway only
+        logger.exception(f"pfSense sync to {config} failed")
+        metrics['errors'].append(str(e))
+
+    duration = time.monotonic() - started
+    metrics['duration_seconds'] = round(duration, 3)
+    metrics['throughput'] = round(metrics['synced'] / duration, 1) if duration else 0
+
+    now = timezone.now()
+    state = {
+        'sync_cursor': cursor,
+        'sync_lease_until': None,
+        'last_sync': now,
+        'last_sync_count': metrics['synced'],
+        'last_sync_duration': metrics['duration_seconds'],
+    }
+    if metrics['errors']:
+        failures = config.consecutive_failures + 1
+        state.update(
+            consecutive_failures=failures,
+            next_attempt_at=now + timedelta(seconds=backoff_seconds(failures)),
+            last_error=metrics['errors'][0],
+        )
+    else:
+        state.update(consecutive_failures=0, next_attempt_at=None, last_error=None)
+    PfSenseConfig.objects.filter(id=config.id).update(**state)
+
+    if metrics['synced'] or metrics['errors']:
+        audit.log(
+            'gateway_synced', 'sync',
+            action=f"failed: {metrics['errors'][0]}" if metrics['errors'] else '',
+            user=user,
+            count=metrics['synced'],
+            target=config.name,
+        )
+    logger.info(f"pfSense sync to {config}: {metrics}")
+    return metrics
+
+
+def _sync_claimed_gateway(config, batch_size, workers, user):
+    try:
+        return sync_gateway(config, batch_size=batch_size, workers=workers, user=user)
+    finally:
+        # gateway threads get their own DB connection
+        connection.close()
+
+
+def sync_all_gateways(configs=None, force=False, batch_size=SYNC_BATCH_SIZE, workers=SYNC_WORKERS, user=None):
+    """
+    Fans a sync out to every active gateway (or `configs`), one thread per
+    gateway, so a slow or failing firewall only delays itself. Gateways that
+    are backing off or already syncing elsewhere are skipped. Vouchers whose
+    latest change every active gateway has received are then flagged
+    synced_to_pfsense. Returns {gateway id: metrics}, for a skipped gateway
+    {'gateway': name, 'skipped': True}; names need not be unique.
+    """
+    low_water = lowest_cursor()
+    if configs is None:
+        configs = PfSenseConfig.objects.filter(is_active=True).order_by('id')
+    configs = list(configs)
+
+    results = {config.id: {'gateway': config.name, 'skipped': True} for config in configs}
+    claimed = [config for config in configs if claim_gateway(config, force=force)]
+    if claimed:
+        with ThreadPoolExecutor(max_workers=min(len(claimed), SYNC_MAX_GATEWAYS)) as pool:
+            futures = {
+                pool.submit(_sync_claimed_gateway, config, batch_size, workers, user): config
+                for config in claimed
+            }
+            for future, config in futures.items():
+                results[config.id] = future.result()
+
+    mark_synced(low_water)
+    return results
+
+
+def lowest_cursor():
+    """Journal position every active gateway has reached"""
+    return PfSenseConfig.objects.filter(is_active=True).aggregate(cursor=Min('sync_cursor'))['cursor'] or 0
+
+
+def mark_synced(since):
+    """
+    Flags the vouchers whose latest change every active gateway has received.
+    Only the journal between `since` (the previous lowest cursor) and the
+    current one is looked at. Returns how many vouchers were flagged.
+    """
+    cursor = lowest_cursor()
+    if cursor <= since:
+        return 0
+    changed = VoucherChange.objects.filter(id__gt=since, id__lte=cursor).values('voucher_id')
+    changed_again = VoucherChange.objects.filter(id__gt=cursor).values('voucher_id')
+    return (
+        Vouchers.objects.filter(id__in=changed, synced_to_pfsense=False)
+        .exclude(id__in=changed_again)
+        .update(synced_to_pfsense=True)
+    )
+
+
+def gateway_stats():
+    """Per-gateway sync state for the stats endpoint"""
+    now = timezone.now()
+    return [
+        {
+            'id': config.id,
+            'name': config.name,
+            'host': config.host,
+            'is_active': config.is_active,
+            'last_sync': config.last_sync,
+            'last_sync_count': config.last_sync_count,
+            'last_sync_duration': config.last_sync_duration,
+            'throughput': round(config.last_sync_count / config.last_sync_duration, 1) if config.last_sync_duration else 0,
+            'pending_changes': pending_changes(config).count(),
+            'syncing': bool(config.sync_lease_until and config.sync_lease_until > now),
+            'consecutive_failures': config.consecutive_failures,
+            'next_attempt_at': config.next_attempt_at,
+            'last_error': config.last_error,
+        }
+        for config in PfSenseConfig.objects.order_by('id')
+    ]
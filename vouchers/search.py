@@ -0,0 +1,96 @@
+from string import Formatter
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from users.models import User
+from .models import VoucherLogs, VoucherCategory, render_log_message
+
+# FTS5 trigram table over action and target, kept in step by triggers
+# (migrations 0011/0012, SQLite builds with the trigram tokenizer only).
+# Rebuilding vouchers_voucherlogs on SQLite drops the triggers, searches then
+# fall back to icontains until a migration recreates them.
+FTS_TABLE = 'vouchers_voucherlogs_fts'
+FTS_TRIGGER = 'vouchers_voucherlogs_fts_insert'
+# trigram matching needs at least one trigram
+MIN_FTS_QUERY = 3
+
+_fts_tables = {}
+
+
+def _has_fts(connection):
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", [FTS_TRIGGER])
+            _fts_tables[key] = cursor.fetchone() is not None
+    return _fts_tables[key]
+
+
+def fts_phrase(q):
+    """q as one FTS5 phrase: matched as a substring by the trigram tokenizer"""
+    return '"' + q.replace('"', '""') + '"'
+
+
+def _template_text(template):
+    """The fixed words of an event template, without its placeholders"""
+    return [literal for literal, _, _, _ in Formatter().parse(template) if literal]
+
+
+def matching_events(q):
+    """Events whose displayed text (VoucherLogs.EVENT_MESSAGES) contains q"""
+    q = q.casefold()
+    return [
+        event for event, template in VoucherLogs.EVENT_MESSAGES.items()
+        if any(q in literal.casefold() for literal in _template_text(template))
+    ]
+
+
+def search_logs(queryset, q):
+    """
+    Narrows a VoucherLogs queryset to entries whose action, target or
+    username contains q, case-insensitively, or whose displayed message does
+    through its event text or category name (see VoucherLogs.message).
+
+    On SQLite action and target are looked up in the FTS5 trigram index; on
+    Postgres the icontains filters below are served by the pg_trgm indexes.
+    Queries shorter than a trigram, and other backends, scan with icontains.
+    Usernames and category names are matched on their tables and events on
+    the templates either way.
+    """
+    q = q.strip()
+    if not q:
+        return queryset
+
+    shown = (
+        Q(user__in=User.objects.filter(username__icontains=q))
+        | Q(category__in=VoucherCategory.objects.filter(name__icontains=q))
+        | Q(event__in=matching_events(q))
+    )
+    if q.casefold() in 'system':
+        # entries without a user are shown as made by 'system'
+        shown |= Q(user__isnull=True, event__in=[
+            event for event, template in VoucherLogs.EVENT_MESSAGES.items() if '{user}' in template
+        ])
+    connection = connections[router.db_for_read(VoucherLogs)]
+    if connection.vendor == 'sqlite' and len(q) >= MIN_FTS_QUERY and _has_fts(connection):
+        return queryset.filter(shown | Q(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_phrase(q)]
+        )))
+    return queryset.filter(shown | Q(action__icontains=q) | Q(target__icontains=q))
+
+
+def entry_matches(entry, q):
+    """
+    search_logs for an archived entry (see vouchers.archive), matched
+    against its whole displayed message
+    """
+    q = q.strip().casefold()
+    message = render_log_message(
+        entry.get('event'),
+        entry['action'],
+        username=entry.get('username'),
+        target=entry.get('target'),
+        count=entry.get('count'),
+        category=entry.get('category_name'),
+    )
+    return any(q in (text or '').casefold() for text in (message, entry.get('action'), entry.get('username')))
@@ -1,5 +1,9 @@
+from datetime import datetime, time
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import serializers
 from .models import VoucherCategory, VoucherFile, Vouchers, VoucherLogs, VoucherUser
+from .archive import archived_message
 from users.models import User
 
 
@@ -21,8 +25,17 @@ class VoucherFileSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = VoucherFile
-        fields = ['id', 'name', 'file', 'category', 'category_name', 'user', 'user_detail', 'date_created', 'status']
-        read_only_fields = ['date_created']
+        fields = ['id', 'name', 'file', 'category', 'category_name', 'user', 'user_detail', 'date_created', 'status',
+                  'row_count', 'imported_count', 'duplicate_count', 'malformed_count', 'import_error']
+        read_only_fields = ['date_created', 'status', 'row_count', 'imported_count', 'duplicate_count',
+                            'malformed_count', 'import_error']
+
+
+class VoucherFileProgressSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VoucherFile
+        fields = ['id', 'status', 'row_count', 'imported_count', 'duplicate_count', 'malformed_count', 'import_error']
+        read_only_fields = fields
 
 
 class VouchersSerializer(serializers.ModelSerializer):
@@ -38,15 +51,128 @@ class VouchersSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'date_created', 'date_used', 'date_printed']
 
 
+# values() lookups behind each field of the flat voucher list
+VOUCHER_LIST_FIELDS = {
+    'id': 'id',
+    'voucher_no': 'voucher_no',
+    'file': 'file_id',
+    'file_name': 'file__name',
+    'file_category': 'file__category__name',
+    'user': 'user_id',
+    'user_detail': ('user__id', 'user__username', 'user__email'),
+    'date_created': 'date_created',
+    'date_used': 'date_used',
+    'date_printed': 'date_printed',
+    'status': 'status',
+    'active': 'active',
+    'validity_duration': 'validity_duration',
+    'expiry_time': 'expiry_time',
+    'bandwidth_up': 'bandwidth_up',
+    'bandwidth_down': 'bandwidth_down',
+    'synced_to_pfsense': 'synced_to_pfsense',
+}
+
+
+class VoucherListSerializer:
+    """
+    values()-based serializer for voucher list responses.
+
+    Produces the same fields as VouchersSerializer from one joined query,
+    without building model instances. `fields` limits the output to a subset
+    of VOUCHER_LIST_FIELDS.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = list(fields or VOUCHER_LIST_FIELDS)
+
+    def lookups(self):
+        lookups = []
+        for field in self.fields:
+            lookup = VOUCHER_LIST_FIELDS[field]
+            lookups.extend(lookup if isinstance(lookup, tuple) else [lookup])
+        return lookups
+
+    def to_representation(self, row):
+        data = {}
+        for field in self.fields:
+            lookup = VOUCHER_LIST_FIELDS[field]
+            if isinstance(lookup, tuple):
+                data[field] = {path.split('__')[-1]: row[path] for path in lookup}
+            else:
+                data[field] = row[lookup]
+        return data
+
+
 class VoucherLogsSerializer(serializers.ModelSerializer):
     user_detail = UserSerializer(source='user', read_only=True)
+    # rendered from the structured fields, select user and category
+    action = serializers.CharField(source='message', read_only=True)
     
     class Meta:
         model = VoucherLogs
-        fields = ['id', 'user', 'user_detail', 'action', 'action_type', 'date_created', 'ip_address']
+        fields = ['id', 'user', 'user_detail', 'action', 'action_type', 'event', 'category', 'count', 'target',
+                  'date_created', 'ip_address']
         read_only_fields = ['date_created']
 
 
+class ArchivedLogSerializer(serializers.Serializer):
+    """
+    An archived log entry (a dict from vouchers.archive), in the shape of
+    VoucherLogsSerializer. `users` in the context maps ids to the users still
+    present; deleted ones keep their archived username.
+    """
+    id = serializers.IntegerField()
+    user = serializers.IntegerField(source='user_id', allow_null=True)
+    user_detail = serializers.SerializerMethodField()
+    action = serializers.SerializerMethodField()
+    action_type = serializers.CharField()
+    event = serializers.CharField(allow_null=True, default=None)
+    category = serializers.IntegerField(source='category_id', allow_null=True, default=None)
+    count = serializers.IntegerField(allow_null=True, default=None)
+    target = serializers.CharField(allow_null=True, default=None)
+    date_created = serializers.DateTimeField()
+    ip_address = serializers.CharField(allow_null=True)
+
+    def get_action(self, entry):
+        return archived_message(entry)
+
+    def get_user_detail(self, entry):
+        if entry['user_id'] is None:
+            return None
+        user = self.context.get('users', {}).get(entry['user_id'])
+        if user is None:
+            return {'id': entry['user_id'], 'username': entry['username'], 'email': None}
+        return UserSerializer(user).data
+
+
+class LogRangeSerializer(serializers.Serializer):
+    """start/end of a log query: dates or datetimes, a date `end` includes the whole day"""
+    start = serializers.CharField(required=False)
+    end = serializers.CharField(required=False)
+
+    def _parse(self, value, end_of_day=False):
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise serializers.ValidationError("Expected a date or an ISO 8601 datetime")
+            moment = datetime.combine(day, time.max if end_of_day else time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def validate_start(self, value):
+        return self._parse(value)
+
+    def validate_end(self, value):
+        return self._parse(value, end_of_day=True)
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError("start is after end")
+        return data
+
+
 class VoucherUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = VoucherUser
@@ -82,4 +208,39 @@ class VoucherDetailSerializer(serializers.ModelSerializer):
                   'date_created', 'date_used', 'date_printed', 'status', 'active', 
                   'validity_duration', 'expiry_time', 'bandwidth_up', 'bandwidth_down',
                   'pfsense_roll_id', 'synced_to_pfsense', 'voucher_user_detail']
-        read_only_fields = ['id', 'date_created', 'date_used', 'date_printed']
\ No newline at end of file
+        read_only_fields = ['id', 'date_created', 'date_used', 'date_printed']
+
+
+class VoucherStatusBatchSerializer(serializers.Serializer):
+    """Voucher numbers for a batch status lookup"""
+    MAX_VOUCHERS = 500
+
+    voucher_nos = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        min_length=1,
+        max_length=MAX_VOUCHERS,
+    )
+
+    def validate_voucher_nos(self, value):
+        # keep the request order, drop repeats
+        return list(dict.fromkeys(value))
+
+
+class UsageIngestSerializer(serializers.Serializer):
+    """
+    Captive portal sessions, posted as records
+    ({"voucher", "mac", "ip", "timestamp"}) or as raw logportalauth lines
+    """
+    MAX_ITEMS = 10000
+
+    records = serializers.ListField(child=serializers.DictField(), required=False, max_length=MAX_ITEMS)
+    lines = serializers.ListField(
+        child=serializers.CharField(allow_blank=True, trim_whitespace=False),
+        required=False,
+        max_length=MAX_ITEMS,
+    )
+
+    def validate(self, data):
+        if not data.get('records') and not data.get('lines'):
+            raise serializers.ValidationError("Send records or lines")
+        return data
@@ -1,6 +1,10 @@
-from django.db.models.signals import m2m_changed, post_save
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
-from .models import Sale, Vouchers
+from finance.models import Sale
+from management.cache import invalidate
+from .models import Vouchers, VoucherCategory, VoucherUser
+from .caching import invalidate_categories, invalidate_voucher_status
+from .journal import record_changes
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
@@ -9,7 +13,8 @@ import datetime
 @receiver(m2m_changed, sender=Sale.voucher.through)
 def handle_voucher_activation(sender, instance, action, **kwargs):
     """
-    When vouchers are added to a sale, set their expiry time based on sale_type
+    When vouchers are added to a sale, set their expiry time based on sale_type.
+    Expired vouchers are picked up by the periodic sweep in vouchers.expiry
     """
     if action == 'post_add':
         voucher_ids = kwargs.get('pk_set', [])
@@ -20,10 +25,10 @@ def handle_voucher_activation(sender, instance, action, **kwargs):
             expiry_time = instance.date + timedelta(hours=1)
 
         elif instance.sale_type == 'day desk':
-            today = instance.date.date()
+            today = timezone.localtime(instance.date).date()
 
             expiry_time = timezone.make_aware(
-                datetime.combine(today, datetime.max.time())
+                datetime.datetime.combine(today, datetime.time.max)
             )
         elif instance.sale_type == 'meeting room':
             expiry_time = instance.date + timedelta(hours=2)
@@ -37,9 +42,32 @@ def handle_voucher_activation(sender, instance, action, **kwargs):
         with transaction.atomic():
             Vouchers.objects.filter(id__in=voucher_ids).update(
                 active=True,
-                expiry_time=expiry_time
+                expiry_time=expiry_time,
+                synced_to_pfsense=False
             )
-        
-        # Schedule the deactivation task
-        for voucher_id in voucher_ids:
-            schedule_voucher_deactivation(voucher_id)
\ No newline at end of file
+            record_changes(voucher_ids)
+            invalidate_voucher_status(
+                Vouchers.objects.filter(id__in=voucher_ids).values_list('voucher_no', flat=True)
+            )
+
+
+@receiver(post_save, sender=VoucherCategory)
+@receiver(post_delete, sender=VoucherCategory)
+def invalidate_category_cache(sender, instance, **kwargs):
+    invalidate_categories()
+    invalidate('dashboard', 'inventory')
+
+
+# no post_delete: a receiver would make deleting a file load each of its
+# vouchers; deleted vouchers drop out of the cache with the timeout
+@receiver(post_save, sender=Vouchers)
+def invalidate_voucher_cache(sender, instance, **kwargs):
+    invalidate_voucher_status([instance.voucher_no])
+
+
+@receiver(post_save, sender=VoucherUser)
+@receiver(post_delete, sender=VoucherUser)
+def invalidate_voucher_user_cache(sender, instance, **kwargs):
+    invalidate_voucher_status(
+        Vouchers.objects.filter(id=instance.voucher_id).values_list('voucher_no', flat=True)
+    )
@@ -1,30 +1,85 @@
-from django_q.tasks import schedule
-from django_q.models import Schedule
-import datetime
-from . models import Vouchers
+from celery import shared_task
+from . models import VoucherFile
+from . import audit
+from .expiry import expire_vouchers
+from .importer import import_voucher_file
+from .pfsense import sync_all_gateways
+from .archive import archive_logs
+from users.models import User
 from loguru import logger
 
-def schedule_voucher_deactivation(voucher_id):
-    """Schedule a task to deactivate a voucher when it expires"""
-    voucher = Vouchers.objects.get(id=voucher_id)
-    
-    Schedule.objects.filter(name=f'deactivate_voucher_{voucher_id}').delete()
-    
-    schedule(
-        'your_app.tasks.deactivate_voucher',
-        voucher_id,
-        name=f'deactivate_voucher_{voucher_id}',
-        schedule_type='O',  # One-time task
-        next_run=voucher.expiry_time
-    )
+@shared_task
+def populate_voucher_file(file_id, user_id, ip_address=None, sync_to_pfsense=False):
+    """
+    Imports a queued VoucherFile, moving it through importing -> populated/failed,
+    then queues its pfSense sync when asked to
+    """
+    claimed = VoucherFile.objects.filter(id=file_id, status='queued').update(status='importing')
+    if not claimed:
+        logger.warning(f"Voucher file {file_id} is not queued for import")
+        return None
+
+    voucher_file = VoucherFile.objects.get(id=file_id)
+    user = User.objects.get(id=user_id)
+
+    def report_progress(counts):
+        VoucherFile.objects.filter(id=file_id).update(
+            row_count=counts['rows'],
+            imported_count=counts['inserted'],
+            duplicate_count=counts['duplicates'],
+            malformed_count=counts['malformed'],
+        )
 
-def deactivate_voucher(voucher_id):
-    """Deactivate a voucher by setting active=False"""
     try:
-        voucher = Vouchers.objects.get(id=voucher_id)
-        if voucher.active and voucher.expiry_time and datetime.today.now() >= voucher.expiry_time:
-            voucher.active = False
-            voucher.save()
-            logger(f"Voucher {voucher.code} deactivated")
-    except Vouchers.DoesNotExist:
-        logger(f"Voucher with ID {voucher_id} not found")
\ No newline at end of file
+        counts = import_voucher_file(voucher_file, user, progress=report_progress)
+    except Exception as e:
+        logger.error(f"Error populating vouchers from {voucher_file.name}: {str(e)}")
+        VoucherFile.objects.filter(id=file_id).update(status='failed', import_error=str(e))
+        return None
+
+    VoucherFile.objects.filter(id=file_id).update(
+        status='populated',
+        row_count=counts['rows'],
+        imported_count=counts['inserted'],
+        duplicate_count=counts['duplicates'],
+        malformed_count=counts['malformed'],
+    )
+
+    audit.log(
+        'file_populated', 'populate',
+        user=user,
+        category_id=voucher_file.category_id,
+        count=counts['inserted'],
+        target=voucher_file.name,
+        ip_address=ip_address,
+    )
+
+    if sync_to_pfsense:
+        sync_vouchers_to_pfsense.delay(user_id=user_id, force=True)
+    return counts
+
+
+@shared_task
+def sync_vouchers_to_pfsense(user_id=None, force=False):
+    """
+    Pushes pending vouchers to every active pfSense gateway in parallel.
+    Runs periodically (CELERY_BEAT_SCHEDULE); force skips the failure backoff
+    for syncs asked for by a user.
+    """
+    user = User.objects.filter(id=user_id).first() if user_id else None
+    return sync_all_gateways(force=force, user=user)
+
+
+@shared_task
+def sweep_expired_vouchers():
+    """
+    Periodic expiry sweep (CELERY_BEAT_SCHEDULE), replaces the per-voucher schedules
+    """
+    return expire_vouchers()
+
+
+@shared_task
+def archive_voucher_logs():
+    """Moves voucher logs past the retention window to the archive, run daily by beat"""
+    archived = archive_logs()
+    return [(month.isoformat(), count) for month, count in archived]
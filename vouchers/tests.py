@@ -1,3 +1,376 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
+from django.db import connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User
+from .models import (
+    Vouchers, VoucherFile, VoucherCategory, VoucherChange, VoucherLogs, VoucherLogArchive, VoucherUser, PfSenseConfig,
+)
+from .journal import changes_after, record_changes, JOURNAL_GAP_SECONDS
+from .search import search_logs, entry_matches
+from .caching import voucher_status, voucher_statuses
+from .pfsense import claim_gateway, lowest_cursor, mark_synced, sync_gateway, sync_all_gateways
+from .usage import ingest_records, normalise_record
+from .expiry import expire_vouchers, expiry_metrics
+from .archive import archive_logs, archived_logs
 
-# Create your tests here.
+
+def make_vouchers(count, status='unused', prefix='V'):
+    user = User.objects.create(username=f"{prefix.lower()}-cashier")
+    category = VoucherCategory.objects.create(name=f"{prefix} category")
+    voucher_file = VoucherFile.objects.create(user=user, name=f"{prefix} roll", category=category, status='populated')
+    Vouchers.objects.bulk_create([
+        Vouchers(user=user, file=voucher_file, voucher_no=f"{prefix}{i:05d}", status=status)
+        for i in range(count)
+    ])
+    return list(Vouchers.objects.filter(file=voucher_file).order_by('id'))
+
+
+class JournalTests(TestCase):
+
+    def setUp(self):
+        self.vouchers = make_vouchers(3)
+        self.old = timezone.now() - timedelta(seconds=JOURNAL_GAP_SECONDS + 60)
+
+    def change(self, change_id, voucher, changed_at=None):
+        VoucherChange.objects.create(id=change_id, voucher=voucher)
+        if changed_at:
+            VoucherChange.objects.filter(id=change_id).update(changed_at=changed_at)
+
+    def test_reads_stop_before_a_recent_gap(self):
+        # id 3 is taken by a transaction that has not committed yet
+        self.change(1, self.vouchers[0])
+        self.change(2, self.vouchers[1])
+        self.change(4, self.vouchers[2])
+
+        self.assertEqual(changes_after(0, 100), [(1, self.vouchers[0].id), (2, self.vouchers[1].id)])
+        self.assertEqual(changes_after(2, 100), [])
+
+    def test_settled_gaps_are_skipped(self):
+        self.change(1, self.vouchers[0])
+        self.change(4, self.vouchers[2], changed_at=self.old)
+
+        self.assertEqual(changes_after(0, 100), [(1, self.vouchers[0].id), (4, self.vouchers[2].id)])
+
+    def test_late_commit_is_read_once_the_gap_fills(self):
+        self.change(1, self.vouchers[0])
+        self.change(3, self.vouchers[2])
+        self.assertEqual(changes_after(0, 100), [(1, self.vouchers[0].id)])
+
+        self.change(2, self.vouchers[1])
+        self.assertEqual([change_id for change_id, _ in changes_after(1, 100)], [2, 3])
+
+
+class ExpirySweepTests(TestCase):
+
+    def setUp(self):
+        self.vouchers = make_vouchers(4, status='sold')
+        now = timezone.now()
+        Vouchers.objects.filter(id__in=[voucher.id for voucher in self.vouchers[:3]]).update(
+            active=True, expiry_time=now - timedelta(minutes=5)
+        )
+        Vouchers.objects.filter(id=self.vouchers[3].id).update(active=True, expiry_time=now + timedelta(hours=1))
+
+    def sweep(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return expire_vouchers(batch_size=2)
+
+    def test_expired_vouchers_are_logged_once(self):
+        metrics = self.sweep()
+
+        self.assertEqual((metrics['expired'], metrics['batches'], metrics['pending_before']), (3, 2, 3))
+        logged = VoucherLogs.objects.filter(event='voucher_expired').values_list('target', flat=True)
+        self.assertEqual(sorted(logged), [voucher.voucher_no for voucher in self.vouchers[:3]])
+
+        self.assertEqual(self.sweep()['expired'], 0)
+        self.assertEqual(VoucherLogs.objects.filter(event='voucher_expired').count(), 3)
+
+    def test_last_sweep_is_shared_through_the_database(self):
+        self.assertIsNone(expiry_metrics()['last_sweep'])
+        metrics = self.sweep()
+        cache.clear()
+
+        self.assertEqual(expiry_metrics()['last_sweep'], metrics)
+        self.assertEqual(expiry_metrics()['backlog']['pending'], 0)
+
+
+class LogSearchTests(TestCase):
+    """Search finds log entries by the message they are shown with"""
+
+    def setUp(self):
+        self.vouchers = make_vouchers(2)
+        user = User.objects.create(username='alice')
+        daily = VoucherCategory.objects.create(name='Daily')
+        self.expired = VoucherLogs.objects.create(event='voucher_expired', action_type='expire', target='V00000')
+        self.printed = VoucherLogs.objects.create(
+            event='voucher_printed', action_type='print', user=user, category=daily, target='V00001'
+        )
+
+    def search(self, q):
+        return set(search_logs(VoucherLogs.objects.all(), q))
+
+    def test_event_text_and_category_are_matched(self):
+        self.assertEqual(self.printed.message, "alice marked voucher V00001 as printed (Daily)")
+        self.assertEqual(self.search('expired'), {self.expired})
+        self.assertEqual(self.search('Printed'), {self.printed})
+        self.assertEqual(self.search('daily'), {self.printed})
+        self.assertEqual(self.search('alice'), {self.printed})
+        self.assertEqual(self.search('V0000'), {self.expired, self.printed})
+        populated = VoucherLogs.objects.create(event='file_populated', action_type='populate', target='Roll 1', count=5)
+        self.assertEqual(populated.message, "system populated 5 vouchers from Roll 1")
+        self.assertEqual(self.search('system'), {populated})
+        self.assertEqual(self.search('weekly'), set())
+
+    def test_archived_entries_match_their_message(self):
+        entry = {
+            'event': 'voucher_printed', 'action': '', 'username': 'alice',
+            'target': 'V00001', 'count': None, 'category_name': 'Daily',
+        }
+        for q in ('printed', 'DAILY', 'alice marked voucher V00001'):
+            self.assertTrue(entry_matches(entry, q), q)
+        self.assertFalse(entry_matches(entry, 'expired'))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PerProcessCacheTests(TestCase):
+    """With a cache per process, status changed by a worker is never served stale"""
+
+    def test_status_is_read_from_the_database(self):
+        voucher, = make_vouchers(1)
+        self.assertEqual(voucher_status(voucher.voucher_no)['status'], 'unused')
+        self.assertEqual(voucher_statuses([voucher.voucher_no])[voucher.voucher_no]['status'], 'unused')
+
+        # as the expiry sweep would, from a process whose invalidation this one never sees
+        Vouchers.objects.filter(id=voucher.id).update(status='used')
+
+        self.assertEqual(voucher_status(voucher.voucher_no)['status'], 'used')
+        self.assertEqual(voucher_statuses([voucher.voucher_no])[voucher.voucher_no]['status'], 'used')
+
+
+class ArchivedLogPagingTests(TestCase):
+    """Log ranges reaching into the archive are paged, and read only the files a page needs"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+        now = timezone.now()
+        for days_ago in (200, 199, 198, 150, 149, 148, 2, 1, 0):
+            log = VoucherLogs.objects.create(event='voucher_expired', action_type='expire', target=f"V{days_ago:05d}")
+            VoucherLogs.objects.filter(id=log.id).update(date_created=now - timedelta(days=days_ago))
+        archive_logs(retention_days=90)
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(username='auditor'))
+
+    def test_range_is_paged_across_table_and_archive(self):
+        self.assertEqual(VoucherLogArchive.objects.count(), 2)
+        self.assertEqual(VoucherLogs.objects.count(), 3)
+
+        targets, cursor, pages = [], None, 0
+        while True:
+            params = {'end': timezone.now().isoformat(), 'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            response = self.api.get('/vouchers/api/v1/logs/', params)
+            self.assertEqual(response.status_code, 200, response.data)
+            pages += 1
+            self.assertLessEqual(len(response.data['results']), 2)
+            targets += [entry['target'] for entry in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not response.data['has_more']:
+                break
+
+        self.assertEqual(pages, 5)
+        self.assertEqual(targets, [f"V{days_ago:05d}" for days_ago in (0, 1, 2, 148, 149, 150, 198, 199, 200)])
+
+    def test_older_archive_files_are_not_opened_for_a_full_page(self):
+        older = VoucherLogArchive.objects.order_by('end').first()
+        # reading it now would fail
+        older.file.delete(save=False)
+
+        entries = archived_logs(end=timezone.now(), limit=3)
+
+        self.assertEqual([entry['target'] for entry in entries], ['V00148', 'V00149', 'V00150'])
+
+
+class UsageIngestTests(TestCase):
+
+    def test_invalid_ip_is_dropped(self):
+        record = {'voucher': 'V00001', 'mac': '00:11:22:33:44:55', 'timestamp': '2026-10-18T20:00:01Z'}
+        for ip in ('1.2.3', '::::', '999.1.1.1'):
+            self.assertIsNone(normalise_record(dict(record, ip=ip))[3])
+        self.assertEqual(normalise_record(dict(record, ip='fe80::1'))[3], 'fe80::1')
+
+    def test_bad_ip_does_not_lose_the_batch(self):
+        vouchers = make_vouchers(3, status='sold')
+        VoucherUser.objects.create(voucher=vouchers[0], voucher_no=vouchers[0].voucher_no, name='a', phonenumber='1')
+        records = [
+            {'voucher': vouchers[0].voucher_no, 'mac': '00:11:22:33:44:55', 'ip': '1.2.3'},
+            {'voucher': vouchers[1].voucher_no, 'mac': '00:11:22:33:44:56', 'ip': '::::'},
+            {'voucher': vouchers[2].voucher_no, 'mac': '00:11:22:33:44:57', 'ip': '10.0.0.7'},
+        ]
+
+        # log entries are written when the chunk's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = ingest_records(records)
+
+        self.assertEqual((counts['used'], counts['malformed']), (3, 0))
+        self.assertEqual(Vouchers.objects.filter(status='used').count(), 3)
+        self.assertIsNone(VoucherUser.objects.get(voucher=vouchers[0]).last_used_ip)
+        self.assertEqual(
+            dict(VoucherLogs.objects.filter(event='portal_login').values_list('target', 'ip_address')),
+            {vouchers[0].voucher_no: None, vouchers[1].voucher_no: None, vouchers[2].voucher_no: '10.0.0.7'},
+        )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'index names in plans are checked on SQLite')
+class HotQueryIndexTests(TestCase):
+    """The hot voucher and log queries are served by their indexes (partial ones included)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vouchers = make_vouchers(20)
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(f"INDEX {name}" in plan for name in index_names), plan)
+
+    def test_unused_vouchers_of_a_category(self):
+        category_id = self.vouchers[0].file.category_id
+        self.assertUsesIndex(
+            Vouchers.objects.filter(status='unused', file__category_id=category_id).order_by('id').values('id'),
+            'vouchers_status_file_idx', 'vouchers_unused_idx',
+        )
+
+    def test_voucher_list_by_status(self):
+        self.assertUsesIndex(
+            Vouchers.objects.filter(status='printed').order_by('-date_created', '-id'),
+            'vouchers_status_created_idx',
+        )
+
+    def test_expiry_sweep(self):
+        self.assertUsesIndex(
+            Vouchers.objects.filter(active=True, expiry_time__lte=timezone.now()).order_by('expiry_time').values('id'),
+            'vouchers_expiring_idx',
+        )
+
+    def test_logs_by_action_type_and_date(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            VoucherLogs.objects.filter(action_type='use', date_created__gte=since).order_by('-date_created', '-id'),
+            'voucherlogs_type_created_idx',
+        )
+
+    def test_logs_by_date(self):
+        self.assertUsesIndex(
+            VoucherLogs.objects.order_by('-date_created', '-id'),
+            'voucherlogs_created_idx',
+        )
+
+
+class StubPortal(BaseHTTPRequestHandler):
+    """pfSense voucher endpoint: records each posted batch, answers with server.respond(batch)"""
+
+    def do_POST(self):
+        batch = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.requests.append(batch)
+            status = self.server.respond(batch, len(self.server.requests))
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class PfSenseSyncTests(TestCase):
+    """The sync pipeline against a stub portal on localhost"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubPortal)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.respond = lambda batch, n: 200
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.vouchers = make_vouchers(5, status='sold')
+        record_changes([voucher.id for voucher in self.vouchers])
+        first_change = VoucherChange.objects.order_by('id').first().id
+        self.config = PfSenseConfig.objects.create(
+            host='127.0.0.1', port=self.server.server_port, use_ssl=False,
+            username='admin', password='pfsense', api_path='/vouchers',
+            sync_cursor=first_change - 1,
+        )
+
+    def sync(self, **options):
+        self.assertTrue(claim_gateway(self.config))
+        since = lowest_cursor()
+        metrics = sync_gateway(self.config, batch_size=2, **options)
+        mark_synced(since)
+        return metrics
+
+    def pushed(self):
+        return [[voucher['voucher'] for voucher in batch['vouchers']] for batch in self.server.requests]
+
+    def synced(self):
+        return set(Vouchers.objects.filter(synced_to_pfsense=True).values_list('voucher_no', flat=True))
+
+    def test_vouchers_are_pushed_in_batches(self):
+        metrics = self.sync(workers=2)
+
+        self.assertEqual(sorted(len(batch) for batch in self.pushed()), [1, 2, 2])
+        self.assertEqual(sorted(sum(self.pushed(), [])), [voucher.voucher_no for voucher in self.vouchers])
+        self.assertEqual(self.server.requests[0]['zone'], 'zone1')
+        self.assertEqual((metrics['synced'], metrics['batches'], metrics['errors']), (5, 3, []))
+        self.assertEqual(self.synced(), {voucher.voucher_no for voucher in self.vouchers})
+
+    def test_503_is_retried(self):
+        self.server.respond = lambda batch, n: 503 if n == 1 else 200
+
+        metrics = self.sync(workers=1)
+
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(self.pushed()[0], self.pushed()[1])
+        self.assertEqual((metrics['synced'], metrics['errors']), (5, []))
+        self.assertEqual(len(self.synced()), 5)
+
+    def test_only_accepted_batches_are_flagged(self):
+        rejected = self.vouchers[2].voucher_no
+        self.server.respond = lambda batch, n: 400 if rejected in [v['voucher'] for v in batch['vouchers']] else 200
+
+        metrics = self.sync(workers=1)
+
+        self.assertEqual(metrics['synced'], 2)
+        self.assertEqual(len(metrics['errors']), 1)
+        self.assertEqual(self.synced(), {voucher.voucher_no for voucher in self.vouchers[:2]})
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.consecutive_failures, 1)
+
+    def test_gateways_sharing_a_name_are_reported_apart(self):
+        # both gateways are syncing elsewhere, so both are skipped
+        leased = timezone.now() + timedelta(minutes=5)
+        PfSenseConfig.objects.update(sync_lease_until=leased)
+        other = PfSenseConfig.objects.create(host='10.0.0.2', username='admin', password='x', sync_lease_until=leased)
+        self.assertEqual(self.config.name, other.name)
+
+        results = sync_all_gateways()
+
+        self.assertEqual(set(results), {self.config.id, other.id})
+        self.assertTrue(all(metrics['skipped'] for metrics in results.values()))
+
+        out = StringIO()
+        call_command('sync_pfsense', stdout=out)
+        self.assertIn(f"(#{self.config.id}): skipped", out.getvalue())
+        self.assertIn(f"(#{other.id}): skipped", out.getvalue())
@@ -1,6 +1,6 @@
 from . import views
 from . import api
-from . api import VoucherListAPIView
+from . api import VoucherListAPIView, ExpiryMetricsAPIView, VoucherInventoryAPIView, VoucherStatusAPIView, VoucherStatusBatchAPIView, PfSenseSyncStatsAPIView, UsageIngestAPIView
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
@@ -20,9 +20,18 @@ urlpatterns = [
     path('printVoucher/<int:pk>/', views.printVoucher, name='printVoucher'),
     path('addVoucherUser/<int:pk>/', views.addVoucherUser, name='addVoucherUser'),
     path("populateVouchers/<int:pk>", views.populateVouchers,  name="populateVouchers"),
+    path("syncToPfsense/", views.syncToPfsense,  name="syncToPfsense"),
+    path("syncToPfsense/<int:pk>/", views.syncToPfsense,  name="syncToPfsense"),
+    path("checkVoucherStatus/<str:voucher_no>/", views.checkVoucherStatus,  name="checkVoucherStatus"),
 
     #api urls
     path("api/v1/vouchers/", VoucherListAPIView.as_view(), name="voucher-list"),
+    path("api/v1/vouchers/status/", VoucherStatusBatchAPIView.as_view(), name="voucher-status-batch"),
+    path("api/v1/vouchers/<str:voucher_no>/status/", VoucherStatusAPIView.as_view(), name="voucher-status"),
+    path("api/v1/expiry/metrics/", ExpiryMetricsAPIView.as_view(), name="expiry-metrics"),
+    path("api/v1/pfsense/stats/", PfSenseSyncStatsAPIView.as_view(), name="pfsense-stats"),
+    path("api/v1/inventory/", VoucherInventoryAPIView.as_view(), name="voucher-inventory"),
+    path("api/v1/usage/", UsageIngestAPIView.as_view(), name="usage-ingest"),
     path('', include(router.urls)),
 ]
  
\ No newline at end of file
@@ -0,0 +1,239 @@
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_ipv46_address
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from loguru import logger
+from .models import Vouchers, VoucherLogs, VoucherUser
+from .inventory import move_inventory
+from .journal import record_changes
+from .caching import invalidate_voucher_status
+from . import audit
+
+INGEST_CHUNK_SIZE = 1000
+BULK_BATCH_SIZE = 500
+
+# a voucher is marked used from any of these, expired ones can't log in
+USABLE_STATUSES = ('unused', 'sold', 'printed', 'used')
+
+# pfSense logportalauth, e.g.
+# Oct 18 20:00:01 fw logportalauth[4242]: Zone: zone1 - Voucher login good for 60 min.: 8FqDZ3k, 00:11:22:33:44:55, 10.0.0.7
+PORTAL_LOG_RE = re.compile(
+    r'^(?P<timestamp>\S+(?: +\d+ \d\d:\d\d:\d\d)?).*?logportalauth\[\d+\]: '
+    r'Zone: (?P<zone>\S+) - (?P<message>[^:]*voucher login[^:]*)[.:]*:? '
+    r'(?P<voucher>[^,\s]+), (?P<mac>[0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5}), (?P<ip>[0-9A-Fa-f:.]+)',
+    re.IGNORECASE,
+)
+MAC_RE = re.compile(r'^[0-9a-f]{2}(?::[0-9a-f]{2}){5}$')
+
+
+def parse_timestamp(value, now=None):
+    """ISO 8601, or the year-less syslog 'Oct 18 20:00:01' in local time"""
+    now = now or timezone.now()
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            return _parse_syslog_timestamp(' '.join(value.split()), now.year, now.replace(second=0, microsecond=0))
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+@lru_cache(maxsize=4096)
+def _parse_syslog_timestamp(value, year, now):
+    # log lines come in bursts sharing a timestamp, parsed once each
+    try:
+        parsed = timezone.make_aware(datetime.strptime(f"{year} {value}", '%Y %b %d %H:%M:%S'))
+    except ValueError:
+        return None
+    if parsed > now + timedelta(minutes=1):
+        # a December line read in January
+        parsed = parsed.replace(year=year - 1)
+    return parsed
+
+
+def parse_portal_line(line, now=None):
+    """
+    A usage record from a logportalauth voucher login line, None for any
+    other line
+    """
+    match = PORTAL_LOG_RE.search(line)
+    if not match:
+        return None
+    return normalise_record({
+        'voucher': match['voucher'],
+        'mac': match['mac'],
+        'ip': match['ip'],
+        'timestamp': match['timestamp'],
+    }, now)
+
+
+def valid_ip(ip):
+    """ip when it is an IPv4/IPv6 address, else None"""
+    try:
+        validate_ipv46_address(ip)
+    except ValidationError:
+        return None
+    return ip
+
+
+def normalise_record(record, now=None):
+    """
+    Validates a posted session record {'voucher', 'mac', 'ip', 'timestamp'};
+    returns (voucher_no, used_at, mac, ip) or None when it can't be used.
+    An ip that is not an address is dropped: the login still counts, but
+    GenericIPAddressField columns are written without model validation.
+    """
+    try:
+        voucher_no = str(record['voucher']).strip()
+        mac = (record.get('mac') or '').strip().lower() or None
+        ip = valid_ip((record.get('ip') or '').strip()) or None
+        used_at = parse_timestamp(record['timestamp'], now) if record.get('timestamp') else (now or timezone.now())
+    except (KeyError, TypeError, AttributeError, ValueError):
+        return None
+    if not voucher_no or used_at is None or (mac and not MAC_RE.match(mac)):
+        return None
+    return voucher_no, used_at, mac, ip
+
+
+def dedupe(records):
+    """
+    One session per voucher: the first login time, with the mac and ip of the
+    latest one
+    """
+    sessions = {}
+    for voucher_no, used_at, mac, ip in records:
+        first = sessions.get(voucher_no)
+        if first is None:
+            sessions[voucher_no] = {'used_at': used_at, 'seen_at': used_at, 'mac': mac, 'ip': ip}
+            continue
+        if used_at < first['used_at']:
+            first['used_at'] = used_at
+        if used_at >= first['seen_at']:
+            first.update(seen_at=used_at, mac=mac or first['mac'], ip=ip or first['ip'])
+    return sessions
+
+
+def ingest_records(records, now=None):
+    """Ingests posted session records; invalid ones are counted as malformed"""
+    normalised = [normalise_record(record, now) if isinstance(record, dict) else None for record in records]
+    valid = [record for record in normalised if record]
+    counts = ingest_usage(valid)
+    counts['malformed'] = len(normalised) - len(valid)
+    return counts
+
+
+def ingest_lines(lines, now=None):
+    """Ingests portal log lines; lines other than voucher logins are counted as ignored"""
+    lines = list(lines)
+    now = now or timezone.now()
+    valid = [record for record in (parse_portal_line(line, now) for line in lines) if record]
+    counts = ingest_usage(valid)
+    counts['ignored'] = len(lines) - len(valid)
+    return counts
+
+
+def ingest_usage(records, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Applies normalised usage records (see normalise_record) to the vouchers.
+
+    Records are deduplicated per voucher, then each chunk of vouchers is
+    loaded with one locked query and written back with bulk_update:
+    status -> used with date_used for first uses, device_mac/last_used_ip on
+    the voucher user. Newly used vouchers get their 'use' logs, journal
+    entries and inventory move in bulk in the same transaction. Replaying the
+    same records changes nothing. Returns the counts.
+    """
+    records = list(records)
+    sessions = dedupe(records)
+    counts = {
+        'records': len(records),
+        'duplicates': len(records) - len(sessions),
+        'used': 0,
+        'updated': 0,
+        'unknown': 0,
+        'expired': 0,
+    }
+
+    codes = list(sessions)
+    for start in range(0, len(codes), chunk_size):
+        chunk = codes[start:start + chunk_size]
+        with transaction.atomic():
+            vouchers = list(
+                Vouchers.objects.select_for_update(of=('self',))
+                .select_related('voucher_user', 'file')
+                .filter(voucher_no__in=chunk)
+                .only('id', 'voucher_no', 'status', 'date_used', 'synced_to_pfsense', 'file__category',
+                      'voucher_user__id', 'voucher_user__device_mac', 'voucher_user__last_used_ip')
+            )
+            counts['unknown'] += len(chunk) - len(vouchers)
+
+            used, changed_vouchers, changed_users = [], [], []
+            moved = Counter()
+            for voucher in vouchers:
+                session = sessions[voucher.voucher_no]
+                if voucher.status not in USABLE_STATUSES:
+                    counts['expired'] += 1
+                    continue
+
+                voucher_changed = False
+                if voucher.status != 'used':
+                    moved[(voucher.file.category_id, voucher.status)] += 1
+                    voucher.status = 'used'
+                    voucher.synced_to_pfsense = False
+                    used.append(voucher)
+                    voucher_changed = True
+                if voucher.date_used is None or session['used_at'] < voucher.date_used:
+                    voucher.date_used = session['used_at']
+                    voucher_changed = True
+                if voucher_changed:
+                    changed_vouchers.append(voucher)
+
+                try:
+                    voucher_user = voucher.voucher_user
+                except VoucherUser.DoesNotExist:
+                    continue
+                if (session['mac'], session['ip']) != (voucher_user.device_mac, voucher_user.last_used_ip):
+                    voucher_user.device_mac = session['mac'] or voucher_user.device_mac
+                    voucher_user.last_used_ip = session['ip'] or voucher_user.last_used_ip
+                    changed_users.append(voucher_user)
+
+            # status and flag are the same for every first use, only date_used
+            # differs per row and needs bulk_update's CASE
+            Vouchers.objects.filter(id__in=[voucher.id for voucher in used]).update(
+                status='used', synced_to_pfsense=False
+            )
+            Vouchers.objects.bulk_update(changed_vouchers, ['date_used'], batch_size=BULK_BATCH_SIZE)
+            VoucherUser.objects.bulk_update(
+                changed_users, ['device_mac', 'last_used_ip'], batch_size=BULK_BATCH_SIZE
+            )
+
+            move_inventory(moved, 'used')
+            record_changes([voucher.id for voucher in used])
+            audit.log_many(
+                VoucherLogs(
+                    event='portal_login',
+                    action_type='use',
+                    action=sessions[voucher.voucher_no]['mac'] or 'unknown device',
+                    voucher=voucher,
+                    category_id=voucher.file.category_id,
+                    target=voucher.voucher_no,
+                    ip_address=sessions[voucher.voucher_no]['ip'],
+                )
+                for voucher in used
+            )
+            # the status document has no device fields, user-only changes keep it
+            invalidate_voucher_status([voucher.voucher_no for voucher in changed_vouchers])
+
+        counts['used'] += len(used)
+        counts['updated'] += len({voucher.id for voucher in changed_vouchers} | {user.voucher_id for user in changed_users})
+
+    if counts['used'] or counts['updated']:
+        logger.info(f"Ingested voucher usage: {counts}")
+    return counts
@@ -1,14 +1,21 @@
-from vouchers.models import VoucherFile, Vouchers, VoucherCategory, VoucherLogs, VoucherUser
-from django.db.models import Q
+from vouchers.models import VoucherFile, Vouchers, VoucherCategory, VoucherLogs, VoucherUser, PfSenseConfig
 from django.contrib import messages
 from .serializers import *
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required 
 from vouchers.forms import AddVoucherFileForm, VoucherUserForm
+from vouchers.tasks import populate_voucher_file, sync_vouchers_to_pfsense
 from django.http import JsonResponse
 from django.template.loader import render_to_string
 from loguru import logger
 from django.utils import timezone
+from management.pagination import KeysetPaginator
+from django.db import transaction
+from .inventory import adjust_inventory
+from .journal import record_changes
+from . import audit
+from .search import search_logs
+from .caching import category_list, voucher_status
 
 
 def get_client_ip(request):
@@ -29,15 +36,15 @@ def voucherFiles(request):
         if form.is_valid():
             voucher_object = form.save(commit=False)
             voucher_object.user = request.user
-            voucher_object.save()
-            
-            voucher_log = VoucherLogs(
-                user=request.user,
-                action=f"{request.user.username} created file {request.POST['name']}",
-                action_type='create',
-                ip_address=get_client_ip(request)
-            )
-            voucher_log.save()
+            with transaction.atomic():
+                voucher_object.save()
+                audit.log(
+                    'file_created', 'create',
+                    user=request.user,
+                    category_id=voucher_object.category_id,
+                    target=voucher_object.name,
+                    ip_address=get_client_ip(request),
+                )
             messages.success(request, 'Voucher file created successfully')
             return redirect('vouchers:voucherFiles')
 
@@ -49,11 +56,10 @@ def voucherFiles(request):
 
 @login_required(login_url='/users/login/')
 def vouchersList(request):
-    page = int(request.GET.get('page', 1))
-    page_size = 20
+    cursor = request.GET.get('cursor')
 
-    vou = Vouchers.objects.all()
-    categories = VoucherCategory.objects.all()
+    vou = Vouchers.objects.all().select_related('file__category')
+    categories = category_list()
 
     q = request.GET.get('q', '')
     status_filter = request.GET.get('status', 'unused')
@@ -71,13 +77,7 @@ def vouchersList(request):
             # If q is not a valid integer, try filtering by category name
             filtered_vouchers = filtered_vouchers.filter(file__category__name__icontains=q)
 
-    start = (page - 1) * page_size
-    end = start + page_size
-
-    total_vouchers = filtered_vouchers.count()
-    has_more = total_vouchers > end
-
-    vouchers_page = filtered_vouchers[start:end]
+    vouchers_page, has_more, next_cursor = KeysetPaginator(filtered_vouchers).page(cursor)
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         html = render_to_string(
@@ -88,12 +88,12 @@ def vouchersList(request):
         return JsonResponse({
             'html': html,
             'has_more': has_more,
-            'next_page': page + 1 if has_more else None
+            'next_cursor': next_cursor
         })
 
     return render(request, 'vouchers/vouchers_list.html', {
         'has_more': has_more,
-        'next_page': page + 1 if has_more else None,
+        'next_cursor': next_cursor,
         'vouchers': vouchers_page,
         'categories': categories,
         'current_status': status_filter,
@@ -114,15 +114,15 @@ def addCategory(request):
             return redirect('vouchers:voucherFiles')
             
         new_category = VoucherCategory(name=category_name)
-        new_category.save()
-        
-        voucher_log = VoucherLogs(
-            user=request.user,
-            action=f"{request.user.username} created category {category_name}",
-            action_type='create',
-            ip_address=get_client_ip(request)
-        )
-        voucher_log.save()
+        with transaction.atomic():
+            new_category.save()
+            audit.log(
+                'category_created', 'create',
+                user=request.user,
+                category=new_category,
+                target=category_name,
+                ip_address=get_client_ip(request),
+            )
         
         messages.success(request, 'Category successfully added')
     
@@ -131,63 +131,66 @@ def addCategory(request):
 
 @login_required(login_url='/users/login/')    
 def populateVouchers(request, pk):
-    files = VoucherFile.objects.all()
-    
     try:
         file = VoucherFile.objects.get(pk=pk)
     except VoucherFile.DoesNotExist:
         messages.error(request, 'Voucher file not found')
         return redirect('vouchers:voucherFiles')
 
-    if file.status != 'not populated':
-        messages.error(request, "File is already populated")
+    # Only one import per file: the conditional update is the lock
+    queued = VoucherFile.objects.filter(pk=pk, status__in=['not populated', 'failed']).update(
+        status='queued',
+        row_count=0,
+        imported_count=0,
+        duplicate_count=0,
+        malformed_count=0,
+        import_error=None,
+    )
+    if not queued:
+        messages.error(request, f"File is already {file.status}")
         return redirect('vouchers:voucherFiles')
 
     try:
-        voucher_count = 0
-        with open(file.file.path, "r") as f:
-            lines = f.readlines()
-            
-            for line in lines[7:]:
-                voucher_code = line.strip()
-                if voucher_code:
-                    if not Vouchers.objects.filter(voucher_no=voucher_code).exists():
-                        voucher = Vouchers(
-                            user=request.user,
-                            voucher_no=voucher_code,
-                            file=file,
-                            validity_duration=24,
-                        )
-                        voucher.save()
-                        voucher_count += 1
-        
-        file.status = 'populated'
-        file.save()
-        
-        voucher_log = VoucherLogs(
-            user=request.user,
-            action=f"{request.user.username} populated {voucher_count} vouchers from {file.name}",
-            action_type='populate',
-            ip_address=get_client_ip(request)
+        populate_voucher_file.delay(
+            file.id,
+            request.user.id,
+            get_client_ip(request),
+            sync_to_pfsense=request.POST.get('sync_to_pfsense') == 'yes',
         )
-        voucher_log.save()
-        
-        messages.success(request, f"Successfully populated {voucher_count} vouchers")
-        
-        if request.POST.get('sync_to_pfsense') == 'yes':
-            return redirect('vouchers:syncToPfsense', pk=pk)
-        
-        return redirect('vouchers:vouchersList')
-        
     except Exception as e:
-        logger.error(f"Error populating vouchers: {str(e)}")
-        messages.error(request, f"Error populating vouchers: {str(e)}")
+        logger.error(f"Error queueing voucher import: {str(e)}")
+        VoucherFile.objects.filter(pk=pk).update(status='failed', import_error=str(e))
+        messages.error(request, f"Error queueing voucher import: {str(e)}")
         return redirect('vouchers:voucherFiles')
 
+    messages.success(request, f"Import of {file.name} queued")
+    return redirect('vouchers:voucherFiles')
+
 
 @login_required(login_url='/users/login/')
 def syncToPfsense(request, pk=None):
-    pass
+    """
+    Queues a sync of every pending voucher (a file's vouchers included) to all
+    active pfSense gateways
+    """
+    if pk is not None and not VoucherFile.objects.filter(pk=pk).exists():
+        messages.error(request, 'Voucher file not found')
+        return redirect('vouchers:voucherFiles')
+
+    gateways = PfSenseConfig.objects.filter(is_active=True).count()
+    if not gateways:
+        messages.error(request, 'No active pfSense configuration')
+        return redirect('vouchers:voucherFiles')
+
+    try:
+        sync_vouchers_to_pfsense.delay(user_id=request.user.id, force=True)
+    except Exception as e:
+        logger.error(f"Error queueing pfSense sync: {str(e)}")
+        messages.error(request, f"Error queueing pfSense sync: {str(e)}")
+        return redirect('vouchers:voucherFiles')
+
+    messages.success(request, f"Sync to {gateways} pfSense gateway(s) queued")
+    return redirect('vouchers:voucherFiles')
 
 
 @login_required(login_url='/users/login/')
@@ -195,10 +198,10 @@ def addVoucherUser(request, pk):
     voucher_users = VoucherUser.objects.all()
     
     try:
-        voucher = Vouchers.objects.get(id=pk)
+        voucher = Vouchers.objects.select_related('file').get(id=pk)
     except Vouchers.DoesNotExist:
         messages.error(request, 'Voucher not found')
-        return redirect('vouchers:vouchersList')
+        return redirect('vouchers:voucherList')
     
     if hasattr(voucher, 'voucher_user'):
         messages.warning(request, 'This voucher already has a user assigned')
@@ -212,16 +215,17 @@ def addVoucherUser(request, pk):
             vu_object = form.save(commit=False)
             vu_object.voucher = voucher
             vu_object.voucher_no = voucher.voucher_no
-            vu_object.save()
-            
-            voucher_log = VoucherLogs(
-                user=request.user,
-                action=f"{request.user.username} assigned voucher {voucher.voucher_no} to {vu_object.name}",
-                action_type='create',
-                voucher=voucher,
-                ip_address=get_client_ip(request)
-            )
-            voucher_log.save()
+            with transaction.atomic():
+                vu_object.save()
+                audit.log(
+                    'voucher_assigned', 'create',
+                    action=vu_object.name,
+                    user=request.user,
+                    voucher=voucher,
+                    category_id=voucher.file.category_id,
+                    target=voucher.voucher_no,
+                    ip_address=get_client_ip(request),
+                )
             
             messages.success(request, 'User information saved successfully')
             return redirect('vouchers:printVoucher', voucher.id)
@@ -236,59 +240,60 @@ def addVoucherUser(request, pk):
 @login_required(login_url='/users/login/') 
 def printVoucher(request, pk):
     try:
-        voucher = Vouchers.objects.get(pk=pk) 
+        voucher = Vouchers.objects.select_related('file').get(pk=pk)
     except Vouchers.DoesNotExist:
         messages.error(request, 'Voucher not found')
-        return redirect('vouchers:vouchersList')
+        return redirect('vouchers:voucherList')
     
     if request.method == 'POST':
         status = request.POST.get('status', '')
         if status in ['printed', 'used']:
-            voucher.status = status
-            
-            if status == 'printed' and not voucher.date_printed:
-                voucher.date_printed = timezone.now()
-            
-            voucher.save()
-            
-            voucher_log = VoucherLogs(
-                user=request.user,
-                action=f"{request.user.username} marked voucher {voucher.voucher_no} as {status} ({voucher.file.category.name})",
-                action_type='print' if status == 'printed' else 'use',
-                voucher=voucher,
-                ip_address=get_client_ip(request)
-            )
-            voucher_log.save()
+            with transaction.atomic():
+                # re-read the status under the row lock so the inventory moves from the right bucket
+                previous_status = Vouchers.objects.select_for_update().filter(pk=voucher.pk).values_list('status', flat=True).first()
+                voucher.status = status
+                
+                if status == 'printed' and not voucher.date_printed:
+                    voucher.date_printed = timezone.now()
+                
+                voucher.synced_to_pfsense = False
+                voucher.save()
+                record_changes([voucher.id])
+                if previous_status != status:
+                    adjust_inventory({
+                        (voucher.file.category_id, previous_status): -1,
+                        (voucher.file.category_id, status): 1,
+                    })
+                
+                audit.log(
+                    'voucher_printed' if status == 'printed' else 'voucher_used',
+                    'print' if status == 'printed' else 'use',
+                    user=request.user,
+                    voucher=voucher,
+                    category_id=voucher.file.category_id,
+                    target=voucher.voucher_no,
+                    ip_address=get_client_ip(request),
+                )
             
             messages.success(request, f'Voucher marked as {status}')
-            return redirect('vouchers:vouchersList')
+            return redirect('vouchers:voucherList')
     
     return render(request, 'vouchers/printVoucher.html', {'voucher': voucher})
 
 
 @login_required(login_url='/users/login/')
 def voucherLog(request):
-    page = int(request.GET.get('page', 1))
-    page_size = 20  
+    cursor = request.GET.get('cursor')
     q = request.GET.get('q', '')
     
-    logs = VoucherLogs.objects.all().select_related('user', 'voucher')
+    logs = VoucherLogs.objects.all().select_related('user', 'category')
 
     if q in ['create', 'print', 'populate', 'use', 'sync', 'expire']:
         logs = logs.filter(action_type=q)
     elif q: 
-        logs = logs.filter(
-            Q(user__username__icontains=q) |
-            Q(action__icontains=q)
-        )
+        logs = search_logs(logs, q)
     
-    start = (page - 1) * page_size
-    end = start + page_size
-    
-    total_logs = logs.count()
-    has_more = total_logs > end
-    
-    logs_page = logs[start:end]
+    logs_page, has_more, next_cursor = KeysetPaginator(logs).page(cursor)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest': 
         html = render_to_string(
@@ -299,46 +304,24 @@ def voucherLog(request):
         return JsonResponse({
             'html': html,
             'has_more': has_more,
-            'next_page': page + 1 if has_more else None
+            'next_cursor': next_cursor
         })
     
     return render(request, 'vouchers/voucherLogs.html', {
         'logs': logs_page,
         'has_more': has_more,
-        'next_page': page + 1 if has_more else None,
+        'next_cursor': next_cursor,
         'current_filter': q
     })
 
 
 @login_required(login_url='/users/login/')
 def checkVoucherStatus(request, voucher_no):
-    try:
-        voucher = Vouchers.objects.get(voucher_no=voucher_no)
-        
-        data = {
-            'success': True,
-            'voucher_no': voucher.voucher_no,
-            'status': voucher.status,
-            'active': voucher.active,
-            'validity_duration': voucher.validity_duration,
-            'expiry_time': voucher.expiry_time.isoformat() if voucher.expiry_time else None,
-            'category': voucher.file.category.name,
-            'date_created': voucher.date_created.isoformat(),
-            'date_used': voucher.date_used.isoformat() if voucher.date_used else None,
-            'date_printed': voucher.date_printed.isoformat() if voucher.date_printed else None,
-        }
-        
-        if hasattr(voucher, 'voucher_user'):
-            data['user'] = {
-                'name': voucher.voucher_user.name,
-                'phone': voucher.voucher_user.phonenumber,
-                'email': voucher.voucher_user.email,
-            }
-        
-        return JsonResponse(data)
-        
-    except Vouchers.DoesNotExist:
+    data = voucher_status(voucher_no)
+    if data is None:
         return JsonResponse({
             'success': False,
             'error': 'Voucher not found'
-        }, status=404)
\ No newline at end of file
+        }, status=404)
+
+    return JsonResponse({'success': True, **data})